@@ -0,0 +1,56 @@
+# Throughput benchmark of DataCleaner.apply: row-wise apply vs. vectorized cleaning
+# Run from repository root: python -m benchmarks.cleaning
+#
+import time
+from os import path
+import pandas as pd
+from stages.utils.utils import DataCleaner, stripEndClauses, stripEndClausesSinglePass
+
+def loadSample(n, infile=path.join("resources", "dataset", "Mail_ApplicationDataset.csv")):
+    # repeat the sample dataset until it has n rows
+    sample = pd.read_csv(infile, delimiter=";")
+    repeats = -(-n // len(sample))
+    return pd.concat([sample]*repeats, ignore_index=True).iloc[:n]
+
+def timeCleaning(df, vectorized, lowercasing=False):
+    cleaner = DataCleaner(
+        removeURLs=True,
+        removeMultWhitespace=True,
+        lowercasing=lowercasing,
+        dateFormat="%Y-%m-%d %H:%M:%S",
+        vectorized=vectorized
+    )
+    df = df.copy()
+    start = time.perf_counter()
+    cleaner.apply(df)
+    return df, time.perf_counter()-start
+
+def timeClauses(contents):
+    # end clause stripping only: one find per clause vs. a single search over all clauses
+    start = time.perf_counter()
+    perClause = [stripEndClauses(c, DataCleaner.endClausesList) for c in contents]
+    perClauseTime = time.perf_counter()-start
+    start = time.perf_counter()
+    singlePass = [stripEndClausesSinglePass(c, DataCleaner.endClausesList, DataCleaner.endClausesPattern) for c in contents]
+    singlePassTime = time.perf_counter()-start
+    if perClause != singlePass:
+        raise AssertionError("Single pass clause stripping differs from per-clause stripping")
+    return perClauseTime, singlePassTime
+
+def run(sizes=(2000, 10000, 50000, 200000)):
+    results = []
+    for n in sizes:
+        df = loadSample(n)
+        rowwise, rowwiseTime = timeCleaning(df, vectorized=False)
+        vectorized, vectorizedTime = timeCleaning(df, vectorized=True)
+        # the vectorized path additionally keeps the parsed dates in the Timestamp column
+        if not rowwise.equals(vectorized.drop(columns=["Timestamp"])):
+            raise AssertionError(f"Vectorized cleaning differs from row-wise cleaning for n={n}")
+        perClauseTime, singlePassTime = timeClauses(list(df["Content"]))
+        results.append({"messages": n, "rowwise_s": rowwiseTime, "vectorized_s": vectorizedTime,
+                        "rowwise_msg_per_s": n/rowwiseTime, "vectorized_msg_per_s": n/vectorizedTime,
+                        "clauses_per_clause_s": perClauseTime, "clauses_single_pass_s": singlePassTime})
+    return pd.DataFrame(results)
+
+if __name__ == "__main__":
+    print(run().to_string(index=False))
@@ -0,0 +1,214 @@
+# Deterministic synthetic application mailbox with the schema of resources/dataset/Mail_ApplicationDataset*.csv
+# Run from repository root: python -m benchmarks.corpus 100000 out/synthetic_100k.csv
+#
+import heapq, random, sys
+from datetime import datetime, timedelta
+import pandas as pd
+
+COLUMNS = ["From", "To", "Datetime", "Message-ID", "In-Reply-To", "Subject", "Content", "Label"]
+DATE_FORMAT = "%d.%m.%Y %H:%M:%S" # format of the raw datasets, normalized by the DataCleaner
+
+# labels of the datasets, see topicLabels in main.ipynb
+APPLICATION, AUTO_REPLY, INTERNAL, ORGANIZATIONAL, OFFER, DECLINE = 1, 2, 3, 4, 5, 6
+
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+    "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen", "Daniel",
+    "Lisa", "Matthew", "Nancy", "Anthony", "Betty", "Mark", "Sandra", "Paul", "Ashley", "Steven", "Emily"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez",
+    "Thompson", "White", "Harris", "Clark", "Lewis", "Robinson", "Walker", "Young", "Allen", "King", "Wright"]
+MAIL_DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "hotmail.com", "gmx.net"]
+POSITIONS = ["an Internship in Summer 2022", "a Software Engineer Position", "the Service Technician Position",
+    "a Position as Sales Associate", "the Open Position in Accounting", "a Working Student Position",
+    "the Parts Specialist Position", "a Trainee Position in Marketing"]
+GREETINGS = ["Best regards", "Kind regards", "Regards", "Sincerely", "Yours sincerely", "Warm regards"]
+CONFIDENTIALITY = ("The information contained in this communication is confidential and intended only for the "
+    "addressee(s). If you received this email by mistake, please notify the sender and delete it.")
+
+TEMPLATES = {
+    APPLICATION: (["Application for {position}", "Application", "Applying for {position}"], [
+        "Dear sir or madam,", "I hereby want to apply for {position} posted on https://www.monster.com/job-openings/{slug}.",
+        "Please find attached my application documents including my resume and application letter.",
+        "I have gained first experience during my studies and would love to contribute to your team.",
+        "I would be happy to introduce myself personally and look forward to your response."]),
+    AUTO_REPLY: (["Re: {subject}", "Your Application at {company}"], [
+        "Dear {candidate},", "thank you a lot for your application which has been well received!",
+        "Currently, many emails are reaching us - therefore please allow us up to 10 business days to reply.",
+        "Thank you for your understanding."]),
+    INTERNAL: (["Applicant for {position}", "Re: Applicant for {position}", "Candidate {candidate}"], [
+        "Hi {colleague},", "we received an application from {candidate} for {position}.",
+        "Could you please have a look at the attached documents and let me know your opinion?",
+        "From my side the profile looks promising, the requirements seem to be met.",
+        "Please let me know until the end of the week whether we should invite the candidate."]),
+    ORGANIZATIONAL: (["Question about your application", "Invitation for Personal Meeting", "Re: {subject}"], [
+        "Dear {candidate},", "we would like to get to know you better and invite you to a personal meeting.",
+        "Could you please let us know when you would be available next week?",
+        "In addition, please send us your latest certificates and references.",
+        "We are looking forward to meeting you."]),
+    OFFER: (["Job Offer", "Work contract and start of work", "Re: Work Contract"], [
+        "Dear {candidate},", "we are happy to offer you the position and attached the work contract.",
+        "Please review the salary and the start date and let us know if you have questions.",
+        "Please return the signed contract within two weeks.", "We are looking forward to working with you."]),
+    DECLINE: (["Your Application at {company}", "Re: {subject}"], [
+        "Dear {candidate},", "thank you for your interest in our company and the time you invested.",
+        "Unfortunately, we have decided to continue with other candidates whose profiles match our requirements better.",
+        "We wish you all the best for your future career."])
+}
+CANDIDATE_REPLIES = {
+    ORGANIZATIONAL: ["Dear {practitioner},", "thank you for the invitation, I am available on Tuesday and Thursday.",
+        "Please find attached my certificates.", "I am looking forward to the meeting."],
+    OFFER: ["Dear {practitioner},", "thank you for the offer, I am very happy about it.",
+        "Could we discuss the start date once more?", "Attached you find the signed contract."]
+}
+
+class CorpusGenerator:
+    # Synthetic mailbox of an HR department. Every application is a case: the application of a candidate to the
+    # office address, an auto-reply, internal clarification between practitioners, organizational messages with
+    # the candidate and finally a job offer with negotiation or a decline. Like in the sample datasets, each
+    # team (office address, practitioners and a colleague for clarification) mostly handles one application
+    # after the other, so that cases can be separated by actors and time; larger corpora have more teams.
+    # Candidates apply to a team repeatedly, a share of follow-up messages has no In-Reply-To, so that cases
+    # have to be matched by actors and time. The same seed always gives the same corpus; messages are produced
+    # in chronological order, so that large corpora can be written in chunks.
+    def __init__(self, seed=42, company="ziegler-cat", messagesPerTeam=500, practitionersPerTeam=3, meanGapDays=12,
+            replyRate=0.7, repeatRate=0.05, start=datetime(2017, 5, 2)):
+        self.rnd = random.Random(seed)
+        self.company = company
+        self.domain = f"{company}.com"
+        self.messagesPerTeam = messagesPerTeam
+        self.practitionersPerTeam = practitionersPerTeam
+        self.meanGapDays = meanGapDays
+        self.replyRate = replyRate
+        self.repeatRate = repeatRate
+        self.start = start
+
+    def _team(self, i):
+        # office address and practitioners of team i, the first practitioners handle the applications
+        office = f"office@{self.domain}" if i == 0 else f"office{i}@{self.domain}"
+        practitioners = []
+        for j in range(self.practitionersPerTeam):
+            k = i*self.practitionersPerTeam+j
+            first, last = FIRST_NAMES[k % len(FIRST_NAMES)], LAST_NAMES[(k*7+k//len(FIRST_NAMES)) % len(LAST_NAMES)]
+            suffix = k//(len(FIRST_NAMES)*len(LAST_NAMES)) or ""
+            practitioners.append((f"{first.lower()}.{last.lower()}{suffix}@{self.domain}", f"{first} {last}"))
+        return {"office": office, "practitioners": practitioners, "candidates": []}
+
+    def _candidate(self, team):
+        # a new candidate or one that applied to the team before
+        if team["candidates"] and self.rnd.random() < self.repeatRate:
+            return self.rnd.choice(team["candidates"])
+        first, last = self.rnd.choice(FIRST_NAMES), self.rnd.choice(LAST_NAMES)
+        address = f"{first[0].lower()}{last.lower()}{self.rnd.randint(1, 9999)}@{self.rnd.choice(MAIL_DOMAINS)}"
+        candidate = (address, f"{first} {last}")
+        team["candidates"].append(candidate)
+        return candidate
+
+    def _messageId(self, sender):
+        return f"{self.rnd.randint(100000, 999999)}.{self.rnd.randint(100000, 999999)}@{sender.split('@')[1].split('.')[0]}"
+
+    def _content(self, sentences, signature, context):
+        # greeting line, a random selection of the template sentences in order and a signature with greeting
+        body = [sentences[0]]+[s for s in sentences[1:] if self.rnd.random() < 0.8]
+        text = "\n\n".join(body)+f"\n\n{self.rnd.choice(GREETINGS)}\n{signature}"
+        if signature != context["candidate"] and self.rnd.random() < 0.5:
+            text += f"\n{self.company.title()}\n{CONFIDENTIALITY}"
+        return text.format(**context)
+
+    def _case(self, team, caseStart):
+        # all messages of one application as (timestamp, row) in the order they are sent
+        candidate, candidateName = self._candidate(team)
+        practitioner, practitionerName = self.rnd.choice(team["practitioners"][:-1])
+        colleague, colleagueName = team["practitioners"][-1]
+        position = self.rnd.choice(POSITIONS)
+        context = {"position": position, "company": self.company.title(), "candidate": candidateName,
+            "practitioner": practitionerName, "colleague": colleagueName.split()[0],
+            "slug": f"{self.rnd.getrandbits(64):016x}"}
+        messages = []
+        time = caseStart
+        previous = {}
+
+        def send(sender, receiver, label, senderName, sentences=None, thread="candidate", delay=(1, 3*24*60)):
+            nonlocal time
+            time += timedelta(minutes=self.rnd.randint(*delay))
+            subjects, templateSentences = TEMPLATES[label]
+            parent = previous.get(thread)
+            context["subject"] = messages[0][1]["Subject"] if messages else ""
+            subject = self.rnd.choice(subjects).format(**context) if parent is None or self.rnd.random() < 0.5 else f"Re: {context['subject']}"
+            row = {
+                "From": sender, "To": receiver, "Datetime": time.strftime(DATE_FORMAT),
+                "Message-ID": self._messageId(sender),
+                "In-Reply-To": parent if parent is not None and self.rnd.random() < self.replyRate else None,
+                "Subject": subject, "Content": self._content(sentences or templateSentences, senderName, context),
+                "Label": label
+            }
+            previous[thread] = row["Message-ID"]
+            messages.append((time, row))
+
+        send(candidate, team["office"], APPLICATION, candidateName, delay=(0, 0))
+        send(practitioner, candidate, AUTO_REPLY, practitionerName, delay=(1, 10))
+        for _ in range(self.rnd.randint(0, 4)):
+            send(practitioner, colleague, INTERNAL, practitionerName, thread="internal", delay=(60, 2*24*60))
+            if self.rnd.random() < 0.6:
+                send(colleague, practitioner, INTERNAL, colleagueName, thread="internal", delay=(30, 24*60))
+        outcome = self.rnd.random()
+        if outcome < 0.4:
+            send(practitioner, candidate, DECLINE, practitionerName)
+        else:
+            for _ in range(self.rnd.randint(1, 4)):
+                send(practitioner, candidate, ORGANIZATIONAL, practitionerName)
+                if self.rnd.random() < 0.8:
+                    send(candidate, practitioner, ORGANIZATIONAL, candidateName, CANDIDATE_REPLIES[ORGANIZATIONAL])
+            if outcome < 0.7:
+                send(practitioner, candidate, DECLINE, practitionerName)
+            else:
+                send(practitioner, candidate, OFFER, practitionerName)
+                for _ in range(self.rnd.randint(0, 2)):
+                    send(candidate, practitioner, OFFER, candidateName, CANDIDATE_REPLIES[OFFER])
+                    send(practitioner, candidate, OFFER, practitionerName)
+        return messages
+
+    def iterChunks(self, n, chunkSize=100000):
+        # yields DataFrames of up to chunkSize messages in chronological order, n messages in total
+        teams = [self._team(i) for i in range(max(1, -(-n // self.messagesPerTeam)))]
+        # next application per team, teams start within the first weeks
+        starts = [(self.start+timedelta(days=self.rnd.uniform(0, 30)), i) for i in range(len(teams))]
+        heapq.heapify(starts)
+        pending = [] # heap of (timestamp, sequence number, row) of started cases
+        sequence = 0
+        produced = 0
+        rows = []
+        while produced < n:
+            caseStart, i = heapq.heappop(starts)
+            messages = self._case(teams[i], caseStart)
+            for time, row in messages:
+                heapq.heappush(pending, (time, sequence, row))
+                sequence += 1
+            # the next application of the team mostly arrives after this case, sometimes while it is still open
+            if self.rnd.random() < 0.2:
+                nextStart = caseStart+timedelta(days=self.rnd.uniform(0, 5))
+            else:
+                nextStart = messages[-1][0]+timedelta(days=self.rnd.expovariate(1/self.meanGapDays))
+            heapq.heappush(starts, (nextStart, i))
+            # messages before the earliest next application cannot be preceded by any message generated later
+            while pending and pending[0][0] <= starts[0][0] and produced < n:
+                rows.append(heapq.heappop(pending)[2])
+                produced += 1
+                if len(rows) == chunkSize:
+                    yield pd.DataFrame(rows, columns=COLUMNS)
+                    rows = []
+        if rows:
+            yield pd.DataFrame(rows, columns=COLUMNS)
+
+def generateCorpus(n, seed=42, **kwargs):
+    return pd.concat(CorpusGenerator(seed, **kwargs).iterChunks(n), ignore_index=True)
+
+def writeCorpus(n, filePath, seed=42, chunkSize=100000, **kwargs):
+    # writes the corpus chunk by chunk in the CSV format of the datasets (separator ;)
+    for i, chunk in enumerate(CorpusGenerator(seed, **kwargs).iterChunks(n, chunkSize)):
+        chunk.to_csv(filePath, sep=";", index=False, mode="w" if i == 0 else "a", header=i == 0)
+    return filePath
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    filePath = sys.argv[2] if len(sys.argv) > 2 else f"synthetic_{n}.csv"
+    print(writeCorpus(n, filePath))
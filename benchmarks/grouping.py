@@ -0,0 +1,74 @@
+# Benchmark of case grouping: scan-based CasesList.groupCases vs. indexed mode and thread reconstruction
+# Run from repository root: python -m benchmarks.grouping
+#
+import random, time
+from datetime import datetime, timedelta
+import pandas as pd
+from stages.TM.textmining import CasesList
+
+def generateMessages(n, seed=42):
+    # synthetic mailbox: short conversations between candidates and a few HR addresses,
+    # follow-up messages partly carry In-Reply-To, the rest has to be matched by actor and time
+    rnd = random.Random(seed)
+    hr = [f"hr{i}@company.com" for i in range(5)]
+    start = datetime(2017, 1, 1)
+    # constant message rate per day, larger mailboxes span a longer period
+    span = max(365, n//100)*24*60
+    rows = []
+    conversation = 0
+    while len(rows) < n:
+        candidate = f"candidate{rnd.randint(0, max(1, conversation//2))}@mail.com"
+        contact = rnd.choice(hr)
+        sent = start + timedelta(minutes=rnd.randrange(span))
+        previous = None
+        for _ in range(min(rnd.randint(1, 6), n-len(rows))):
+            sender, receiver = (candidate, contact) if previous is None or rnd.random() < 0.5 else (contact, candidate)
+            messageId = f"{len(rows)}.{rnd.randint(100000, 999999)}@mail"
+            rows.append({
+                "From": sender,
+                "To": receiver,
+                "Datetime": sent.strftime("%Y-%m-%d %H:%M:%S"),
+                "Message-ID": messageId,
+                "In-Reply-To": previous if previous is not None and rnd.random() < 0.3 else None,
+                "Subject": "Application",
+                "Content": "Dear sir or madam",
+                "Label": 1
+            })
+            previous = messageId
+            sent += timedelta(minutes=rnd.randint(10, 3*24*60))
+        conversation += 1
+    return pd.DataFrame(rows).sort_values("Datetime", kind="stable").reset_index(drop=True)
+
+def timeGrouping(df, maxDays, indexed):
+    start = time.perf_counter()
+    cases = CasesList.groupCases(df.copy(), maxDays, indexed=indexed)
+    return cases, time.perf_counter()-start
+
+def timeThreads(df, maxDays):
+    # rows are shuffled, thread reconstruction does not depend on the row order
+    shuffled = df.sample(frac=1, random_state=1)
+    start = time.perf_counter()
+    cases = CasesList.groupThreads(shuffled, maxDays)
+    return cases, time.perf_counter()-start
+
+def caseAssignment(cases):
+    return [(c.clusterId, [m.meta["Message-ID"] for m in c.messages]) for c in cases]
+
+def run(sizes=(1000, 2000, 4000, 16000, 64000, 256000), maxDays=8, maxScanSize=4000):
+    results = []
+    for n in sizes:
+        df = generateMessages(n)
+        cases, indexedTime = timeGrouping(df, maxDays, indexed=True)
+        _, threadsTime = timeThreads(df, maxDays)
+        scanTime = None
+        if n <= maxScanSize:
+            # scan-based grouping is quadratic, only run on small sizes and check for identical assignment
+            scanCases, scanTime = timeGrouping(df, maxDays, indexed=False)
+            if caseAssignment(scanCases) != caseAssignment(cases):
+                raise AssertionError(f"Indexed grouping differs from scan-based grouping for n={n}")
+        results.append({"messages": n, "cases": len(cases), "scan_s": scanTime, "indexed_s": indexedTime,
+                        "indexed_us_per_msg": indexedTime/n*1e6, "threads_s": threadsTime})
+    return pd.DataFrame(results)
+
+if __name__ == "__main__":
+    print(run().to_string(index=False))
@@ -0,0 +1,44 @@
+# Benchmark of lemmatization: the original lemmatize (model loaded per call, one document at a time)
+# vs. lemmatizeBatched (warm model, nlp.pipe, optional worker processes)
+# Run from repository root: python -m benchmarks.lemmatization
+#
+import time
+import pandas as pd
+import spacy
+from stages.TM.lemmatization import lemmatizeBatched
+from benchmarks.cleaning import loadSample
+
+def lemmatizeUnbatched(corpora, pos_tags=["NOUN", "ADJ", "VERB", "ADV", "PROPN", "DOBJ"]):
+    # lemmatize before it was based on lemmatizeBatched, the baseline of the benchmark
+    nlp = spacy.load("en_core_web_sm", disable=["parser", "ner"])
+    out = []
+    for corpus in corpora:
+        doc = nlp(corpus)
+        out.append([t.lemma_ for t in doc if (t.pos_ in pos_tags and not t.is_stop)])
+    return out
+
+def timeLemmatization(function, corpora, **kwargs):
+    start = time.perf_counter()
+    lemmas = function(corpora, **kwargs)
+    return lemmas, time.perf_counter()-start
+
+def run(sizes=(1000, 5000, 20000), n_process=(1, 2, 4), batch_size=256, model="en_core_web_sm"):
+    results = []
+    for n in sizes:
+        df = loadSample(n)
+        corpora = [f"{subject} {content}" for subject, content in zip(df["Subject"], df["Content"])]
+        reference, referenceTime = timeLemmatization(lemmatizeUnbatched, corpora)
+        result = {"messages": n, "lemmatize_s": referenceTime}
+        for processes in n_process:
+            # first call loads the model (and starts the worker pool), the second one runs warm
+            _, coldTime = timeLemmatization(lemmatizeBatched, corpora, batch_size=batch_size, n_process=processes, model=model)
+            lemmas, warmTime = timeLemmatization(lemmatizeBatched, corpora, batch_size=batch_size, n_process=processes, model=model)
+            if lemmas != reference:
+                raise AssertionError(f"Batched lemmatization differs from lemmatize for n={n}, n_process={processes}")
+            result[f"batched_p{processes}_cold_s"] = coldTime
+            result[f"batched_p{processes}_warm_s"] = warmTime
+        results.append(result)
+    return pd.DataFrame(results)
+
+if __name__ == "__main__":
+    print(run().to_string(index=False))
@@ -0,0 +1,104 @@
+# Scaling benchmark of the pipeline stages on synthetic corpora (benchmarks/corpus.py): runtime and peak memory
+# of cleaning, case grouping, lemmatization, LDA training and inference, event log export, discovery and conformance
+# Run from repository root: python -m benchmarks.suite
+#
+import time, tempfile, tracemalloc
+from os import path
+import pandas as pd
+import gensim
+import gensim.corpora
+from benchmarks.corpus import generateCorpus
+from stages.utils.utils import DataCleaner
+from stages.TM.textmining import CasesList, gen_words
+from stages.TM.lemmatization import lemmatizeBatched
+from stages.TM.ldasweep import DEFAULT_LDA_CONFIG
+from stages.TM.eventlog import writeEventLog
+from stages.PM.processmining import dataFrameToLog, heuristicsMiner
+from stages.PM.conformance import computeVariantMetrics
+from stages.utils.profiling import Profiler
+
+# see main.ipynb
+TOPIC_LABELS = [
+    None, "Initial Application by Candidate",
+    "Automatic Reply", "Internal Communication / Clarification of Requirements",
+    "Organizational Communication with Candidate for Clarification of Skills or Interview Invitation",
+    "Job Offer / Contract Negotiation", "Application Declined"
+]
+
+class StageTimer:
+    # runs the stages of one pipeline pass and keeps runtime (and with traceMemory the tracemalloc peak) per stage;
+    # a failing stage, e.g. lemmatization without the spaCy model, is recorded with its error and returns None
+    def __init__(self, messages, traceMemory=False):
+        self.messages = messages
+        self.traceMemory = traceMemory
+        self.results = []
+
+    def run(self, stage, function, *args, **kwargs):
+        result = {"messages": self.messages, "stage": stage}
+        if self.traceMemory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            value = function(*args, **kwargs)
+            result["error"] = None
+        except Exception as e:
+            value = None
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["seconds"] = time.perf_counter()-start
+        if self.traceMemory:
+            result["peak_mb"] = tracemalloc.get_traced_memory()[1]/2**20
+            tracemalloc.stop()
+        self.results.append(result)
+        return value
+
+def trainLda(texts, passes):
+    id2word = gensim.corpora.Dictionary(texts)
+    corpus = [id2word.doc2bow(text) for text in texts]
+    return gensim.models.ldamodel.LdaModel(corpus=corpus, id2word=id2word, **dict(DEFAULT_LDA_CONFIG, passes=passes)), id2word
+
+def exportEventLog(eventLog, directory, format):
+    return writeEventLog(eventLog, path.join(directory, f"eventlog.{format}"), format)
+
+def runPipeline(df, timer, maxDays=8, passes=2, n_workers=2):
+    # the stages of main.ipynb on one corpus
+    cleaner = DataCleaner(removeURLs=True, removeMultWhitespace=True, lowercasing=False, dateFormat="%Y-%m-%d %H:%M:%S")
+    timer.run("clean", cleaner.apply, df)
+    casesList = timer.run("group", CasesList.groupCases, df, maxDays, compact=True)
+    corpora = casesList.getCorpora()
+    lemmatized = timer.run("lemmatize", lemmatizeBatched, corpora)
+    # without a spaCy model, LDA is trained on the plain gensim tokens
+    texts = timer.run("gen_words", gen_words, lemmatized if lemmatized is not None else [c.split() for c in corpora], cache=False)
+    lda_model, id2word = timer.run("lda_train", trainLda, texts, passes)
+    timer.run("lda_inference", casesList.classifyMessages, lda_model, id2word)
+    eventLog = timer.run("eventlog", casesList.getEventLog, TOPIC_LABELS)
+    with tempfile.TemporaryDirectory() as directory:
+        for format in ("csv", "parquet"):
+            timer.run(f"export_{format}", exportEventLog, eventLog, directory, format)
+    log = timer.run("import_log", dataFrameToLog, eventLog)
+    net, im, fm = timer.run("discovery", heuristicsMiner, log)
+    timer.run("conformance", computeVariantMetrics, log, net, im, fm, n_workers)
+    return timer.results
+
+def run(sizes=(1000, 10000, 100000, 1000000), traceMemory=True, passes=2, n_workers=2, seed=42, outFile=None, profileDir=None):
+    # traceMemory runs every size a second time with tracemalloc, so that tracing does not distort the runtimes;
+    # with profileDir, the stage profile of the timed pass (see stages/utils/profiling.py) is saved per size
+    results = []
+    for n in sizes:
+        start = time.perf_counter()
+        df = generateCorpus(n, seed)
+        generateTime = time.perf_counter()-start
+        with Profiler(meta={"messages": n, "seed": seed}) as profiler:
+            timed = runPipeline(df.copy(), StageTimer(n), passes=passes, n_workers=n_workers)
+        if profileDir:
+            profiler.save(path.join(profileDir, f"profile_{n}.json"))
+        results.append(pd.DataFrame([{"messages": n, "stage": "generate", "error": None, "seconds": generateTime}]+timed))
+        if traceMemory:
+            traced = pd.DataFrame(runPipeline(df, StageTimer(n, traceMemory=True), passes=passes, n_workers=n_workers))
+            results[-1] = results[-1].merge(traced[["stage", "peak_mb"]], on="stage", how="left")
+    results = pd.concat(results, ignore_index=True)
+    if outFile:
+        results.to_csv(outFile, index=False)
+    return results
+
+if __name__ == "__main__":
+    print(run().to_string(index=False))
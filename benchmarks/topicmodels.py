@@ -0,0 +1,90 @@
+# Comparison of the topic model backends (stages/TM/backends.py) on the sample datasets: training time, inference
+# throughput of the labelling step and classification quota
+# Run from repository root: python -m benchmarks.topicmodels
+#
+import time
+from copy import deepcopy
+from glob import glob
+from os import path
+import pandas as pd
+import gensim.corpora
+from stages.utils.discover import loadConfig, readInput, cleanMessages, groupMessages, lemmatizeMessages
+from stages.TM.backends import createBackend
+from stages.TM.topics import classificationQuota
+
+DATASETS = sorted(glob(path.join("resources", "dataset", "Mail_Application*.csv")))
+
+# backend name and its settings in addition to the lda section of the configuration
+BACKENDS = [
+    ("lda", {}),
+    ("multicore", {"workers": 2}),
+    ("multicore", {"workers": 4}),
+    ("nmf", {}),
+    ("sklearn_lda", {"workers": 1})
+]
+
+def prepareDataset(config, inputFile):
+    # cases and training tokens of a dataset like the discover pipeline, without spaCy model the messages are
+    # only tokenized with gen_words
+    config = deepcopy(config)
+    config["input"]["file"] = inputFile
+    casesList = groupMessages(config, cleanMessages(config, readInput(config)))
+    try:
+        tokens = lemmatizeMessages(config, casesList)
+    except OSError as e:
+        print(f"Lemmatization not available ({e}), using gen_words tokens")
+        config["lemmatize"]["model"] = None
+        tokens = lemmatizeMessages(config, casesList)
+    return casesList, tokens
+
+def runBackend(casesList, tokens, backend, params, config, repeats=3):
+    id2word = gensim.corpora.Dictionary(tokens)
+    corpus = [id2word.doc2bow(text) for text in tokens]
+    messages = casesList.getMessages()
+    row = {"backend": backend, "workers": params.get("workers"), "messages": len(messages)}
+    try:
+        trainTimes = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model = createBackend(backend, **dict(config["lda"], **params)).fit(corpus, id2word)
+            trainTimes.append(time.perf_counter()-start)
+        inferenceTimes = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            labels = casesList.classifyMessages(model, id2word, **config["label"])
+            inferenceTimes.append(time.perf_counter()-start)
+        row["train_seconds"] = min(trainTimes)
+        row["inference_seconds"] = min(inferenceTimes)
+        row["messages_per_second"] = len(messages)/row["inference_seconds"]
+        row["quota"] = classificationQuota([m.trainLabel for m in messages], labels.tolist())[0]
+        row["error"] = None
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+def run(datasets=DATASETS, backends=BACKENDS, configFile=None, repeats=3, outFile=None):
+    # best of repeats runtimes per backend and dataset; a dataset without labels is reported with its error
+    config = loadConfig(configFile)
+    results = []
+    for inputFile in datasets:
+        dataset = path.splitext(path.basename(inputFile))[0]
+        try:
+            casesList, tokens = prepareDataset(config, inputFile)
+        except Exception as e:
+            results.append({"dataset": dataset, "error": f"{type(e).__name__}: {e}"})
+            print(f"{dataset}: {results[-1]['error']}")
+            continue
+        for backend, params in backends:
+            row = runBackend(casesList, tokens, backend, params, config, repeats)
+            row["dataset"] = dataset
+            results.append(row)
+            print(f"{row['dataset']} {backend} {params}: " + (row["error"] or f"{row['train_seconds']:.2f}s, quota {row['quota']:.3f}"))
+    results = pd.DataFrame(results)
+    columns = ["dataset", "backend", "workers", "messages", "train_seconds", "inference_seconds", "messages_per_second", "quota", "error"]
+    results = results.reindex(columns=columns)
+    if outFile:
+        results.to_csv(outFile, index=False)
+    return results
+
+if __name__ == "__main__":
+    print(run().to_string(index=False))
@@ -0,0 +1,18 @@
+# Command-line runner of the pipeline of main.ipynb
+# Usage: python main.py -a discover [-c config.json] [-f dataset.csv] [-r stage ...]
+#        python main.py -a discover [-c config.json] -b dataset.csv ... [-w workers] [-m memory limit in MB]
+#
+import sys
+from stages.utils.utils import parseArgs
+from stages.utils.discover import runDiscover
+from stages.utils.batch import runBatch
+
+if __name__ == "__main__":
+    action, arguments = parseArgs()
+    if action == "discover" and arguments["batch"]:
+        summary = runBatch(arguments["batch"], arguments["config"], arguments["workers"], arguments["memory"])
+        print(summary.to_string(index=False))
+    elif action == "discover":
+        runDiscover(arguments["config"], arguments["file"], force=arguments["rerun"])
+    else:
+        sys.exit(f'The action "{action}" is not available in the command-line runner yet.')
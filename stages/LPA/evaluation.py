@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+# weights of the learning metric: duration delta in hours, message count delta, headcount delta
+SCORE_WEIGHTS = {"duration_delta": 0.025, "msg_delta": 0.65, "headcount_delta": 0.2}
+
+def getCaseActorTable(casesList, actors=None, successfulOnly=True, timest_format="%Y-%m-%d %H:%M:%S"):
+    # one row per case and involved actor with the aggregates of the case (a case with several of the actors
+    # is a row for each of them), optionally restricted to a set of actors and to successful cases (see
+    # Case.checkCaseSuccess)
+    stats = casesList.getStatistics(timest_format)
+    success = casesList.getSuccessMask() if successfulOnly else np.ones(len(casesList), dtype=bool)
+    actors = set(actors) if actors is not None else None
+    caseIdx = []
+    caseActors = []
+    for i, case in enumerate(casesList):
+        if not success[i]:
+            continue
+        for actor in dict.fromkeys(case.actors):
+            if actors is None or actor in actors:
+                caseIdx.append(i)
+                caseActors.append(actor)
+    caseIdx = np.array(caseIdx, dtype=np.int64)
+    return pd.DataFrame({
+        "actor": caseActors,
+        "case": [casesList[i].clusterId for i in caseIdx],
+        "date": pd.to_datetime(stats.end[caseIdx], unit="s").normalize(),
+        "duration": stats.duration[caseIdx],
+        "messageCount": stats.messageCount[caseIdx],
+        "headCount": stats.headCount[caseIdx]
+    }), stats, success
+
+def normalizeScores(scores, groups=None):
+    # min-max normalization to 0 <= x <= 1, over all rows or within each group
+    if groups is None:
+        return (scores-scores.min())/(scores.max()-scores.min())
+    grouped = scores.groupby(groups)
+    low = grouped.transform("min")
+    return (scores-low)/(grouped.transform("max")-low)
+
+def getEvaluationTable(casesList, actors=None, cohorts=None, normalize="global", weights=SCORE_WEIGHTS,
+        timest_format="%Y-%m-%d %H:%M:%S"):
+    # Learning metric of getEvaluationList for all actors (or the given ones) as one long-format DataFrame with
+    # one row per actor and successful case: deltas to the medians of all successful cases and the weighted
+    # score. cohorts maps actors to a cohort (dict or Series), normalize is "global", "cohort" or None.
+    table, stats, success = getCaseActorTable(casesList, actors, True, timest_format)
+    table["duration_delta"] = (stats.median("duration", success)-table["duration"])/(60*60)
+    table["msg_delta"] = stats.median("messageCount", success)-table["messageCount"]
+    table["headcount_delta"] = stats.median("headCount", success)-table["headCount"]
+    table["score"] = sum(weight*table[column] for column, weight in weights.items())
+    if cohorts is not None:
+        table["cohort"] = table["actor"].map(cohorts)
+    if normalize == "global":
+        table["score"] = normalizeScores(table["score"])
+    elif normalize == "cohort":
+        if cohorts is None:
+            raise ValueError("Normalization per cohort needs a mapping of actors to cohorts")
+        table["score"] = normalizeScores(table["score"], table["cohort"])
+    elif normalize is not None:
+        raise ValueError(f"Unknown normalization {normalize}, use global, cohort or None")
+    table.drop(columns=["duration", "messageCount", "headCount"], inplace=True)
+    return table.sort_values(["actor", "date"], kind="stable", ignore_index=True)
+
+def getActorEvaluation(table, actor):
+    # rows of one actor in the format of getEvaluationList (date index), e.g. as input to fitParameters.
+    # Unlike getEvaluationList, a case is credited to every involved actor: a case of both p1 and p2 is a row of
+    # both here, while getEvaluationList only counts it for p1 (the global normalization range is the same, the
+    # shared case is already part of it through p1). The rows match getEvaluationList when no case involves both.
+    evaluation = table[table["actor"] == actor].set_index("date")
+    evaluation.index.name = "datestr"
+    return evaluation[["duration_delta", "msg_delta", "headcount_delta", "score"]]
@@ -0,0 +1,92 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy.optimize import curve_fit
+
+def getDayIndex(table, by="actor", date="date"):
+    # days since the first evaluation of each actor, the x-axis of fitParameters
+    return (table[date]-table.groupby(by)[date].transform("min")).dt.days.to_numpy()
+
+def coefficientNames(degree):
+    # c0 is the constant, cj the coefficient of x^j
+    return [f"c{j}" for j in range(degree+1)]
+
+def fitPolynomials(table, degree=3, by="actor", x=None, y="score"):
+    # Least squares polynomial fits y = c0 + c1*x + ... + cdegree*x^degree for all groups (actors) at once.
+    # The polynomials are linear in their coefficients, so the fits of all groups are solved together with
+    # a pseudo-inverse of the stacked design matrices; groups are padded with zero rows, which do not change
+    # the solution. x defaults to the day index per group. Returns one row per group with the coefficients
+    # and the fit quality (n, rss, rmse, r2).
+    xs = getDayIndex(table, by) if x is None else table[x].to_numpy()
+    codes, groups = pd.factorize(table[by])
+    ys = table[y].to_numpy(dtype=np.float64)
+    counts = np.bincount(codes, minlength=len(groups))
+    # position of each row within its group
+    order = np.argsort(codes, kind="stable")
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    positions = np.empty(len(codes), dtype=np.int64)
+    positions[order] = np.arange(len(codes))-np.repeat(starts, counts)
+    # scale x per group to [0, 1] for a well-conditioned design matrix
+    scale = np.ones(len(groups))
+    np.maximum.at(scale, codes, np.abs(xs).astype(np.float64))
+    design = np.zeros((len(groups), counts.max(initial=0), degree+1))
+    target = np.zeros((len(groups), counts.max(initial=0)))
+    design[codes, positions] = (xs/scale[codes])[:, None]**np.arange(degree+1)
+    target[codes, positions] = ys
+    scaled = (np.linalg.pinv(design) @ target[:, :, None])[:, :, 0]
+    coefficients = scaled/scale[:, None]**np.arange(degree+1)
+
+    residuals = target-(design @ scaled[:, :, None])[:, :, 0]
+    rss = (residuals**2).sum(axis=1)
+    means = np.bincount(codes, weights=ys, minlength=len(groups))/np.maximum(counts, 1)
+    tss = np.bincount(codes, weights=(ys-means[codes])**2, minlength=len(groups))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2 = np.where(tss > 0, 1-rss/tss, np.nan)
+    params = pd.DataFrame(coefficients, columns=coefficientNames(degree))
+    params.insert(0, by, groups)
+    params.insert(1, "degree", degree)
+    params["n"] = counts
+    params["rss"] = rss
+    params["rmse"] = np.sqrt(rss/np.maximum(counts, 1))
+    params["r2"] = r2
+    # fewer points than coefficients give no unique fit
+    params["underdetermined"] = counts < degree+1
+    return params
+
+def fitLearningCurves(table, degrees=(2, 3), by="actor", x=None, y="score"):
+    # parameter table of all actors and degrees, missing coefficients of lower degrees are NaN
+    params = pd.concat([fitPolynomials(table, degree, by, x, y) for degree in degrees], ignore_index=True)
+    metrics = ["n", "rss", "rmse", "r2", "underdetermined"]
+    return params[[by, "degree"]+coefficientNames(max(degrees))+metrics]
+
+def evaluatePolynomial(params, x):
+    # values of one fitted curve (a row of the parameter table) at x
+    x = np.asarray(x, dtype=np.float64)
+    return sum(params[f"c{j}"]*x**j for j in range(int(params["degree"])+1))
+
+def _fitGroup(args):
+    objective, x, y, p0 = args
+    try:
+        popt, _ = curve_fit(objective, x, y, p0=p0)
+    except (RuntimeError, TypeError, ValueError):
+        # no convergence or fewer points than parameters
+        popt = np.full(len(p0) if p0 is not None else objective.__code__.co_argcount-1, np.nan)
+    return popt
+
+def fitNonLinear(table, objective, p0=None, by="actor", x=None, y="score", n_workers=4):
+    # curve_fit of an arbitrary (non-linear) objective per group, the groups are fitted in a process pool;
+    # objective has to be a module-level function so that it can be sent to the workers
+    xs = getDayIndex(table, by) if x is None else table[x].to_numpy()
+    groups = []
+    tasks = []
+    for group, rows in table.groupby(by, sort=False).indices.items():
+        groups.append(group)
+        tasks.append((objective, xs[rows], table[y].to_numpy()[rows], p0))
+    if n_workers <= 1:
+        results = list(map(_fitGroup, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(_fitGroup, tasks))
+    params = pd.DataFrame(results, columns=[f"p{i}" for i in range(len(results[0]))] if results else None)
+    params.insert(0, by, groups)
+    return params
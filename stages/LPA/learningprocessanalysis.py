@@ -4,21 +4,26 @@ from scipy.optimize import curve_fit
 from matplotlib import pyplot as plt
 from matplotlib.pyplot import figure
 from stages.TM.textmining import CasesList
+from stages.LPA.fitting import getDayIndex, evaluatePolynomial
+from stages.utils.profiling import profiled
 
+@profiled("lpa", counts=lambda result, p1_id, p2_id, casesList: {"cases": len(casesList)})
 def getEvaluationList(p1_id, p2_id, casesList):
     evaluation_list_p1 = pd.DataFrame(columns=["datestr", "duration_delta", "msg_delta", "headcount_delta"])
     evaluation_list_p2 = pd.DataFrame(columns=["datestr", "duration_delta", "msg_delta", "headcount_delta"])
 
     # Only select subset of successful cases
+    success = casesList.getSuccessMask()
     subcaseList = CasesList()
-    subcaseList.extend([c for c in casesList if c.checkCaseSuccess()])
+    subcaseList.extend([c for c, successful in zip(casesList, success) if successful])
 
+    # medians over the cached case statistics of the successful cases
     # median case duration
-    median_case_duration = subcaseList.getMedianCaseDuration(timest_format="%Y-%m-%d %H:%M:%S")
+    median_case_duration = casesList.getMedianCaseDuration(timest_format="%Y-%m-%d %H:%M:%S", subset=success)
     # median message count between cases
-    median_msg_count = subcaseList.getMedianCaseMessageCount()
+    median_msg_count = casesList.getMedianCaseMessageCount(subset=success)
     # median # of people involved
-    median_head_count = subcaseList.getMedianCaseHeadcount()
+    median_head_count = casesList.getMedianCaseHeadcount(subset=success)
 
     for case in subcaseList:
         if p1_id not in case.actors and p2_id not in case.actors:
@@ -66,6 +71,7 @@ def objective(x, a, b, c):
 def objective_cube(x,a,b,c,d):
     return a*x + b*x**2 + c*x**3+d
 
+@profiled("lpa_fit")
 def fitParameters(evaluation_list_p1, evaluation_list_p2):
     # Reformat x-Axis from dt object to int (days)
     start = evaluation_list_p1.index[0]
@@ -97,7 +103,10 @@ def fitParameters(evaluation_list_p1, evaluation_list_p2):
     a2c,b2c,c2c,d2c = popt2
     return a1, a2, b1, b2, c1, c2, a1c, a2c, b1c, b2c, c1c, c2c, d1c, d2c
 
-def fitAndPlot(evaluation_list_p1, evaluation_list_p2, a1, a2, b1, b2, c1, c2, a1c, a2c, b1c, b2c, c1c, c2c, d1c, d2c):
+def fitAndPlot(evaluation_list_p1, evaluation_list_p2, a1=None, a2=None, b1=None, b2=None, c1=None, c2=None, a1c=None, a2c=None, b1c=None, b2c=None, c1c=None, c2c=None, d1c=None, d2c=None):
+    if "actor" in evaluation_list_p1.columns:
+        # evaluation table of getEvaluationTable and parameter table of fitLearningCurves, any number of actors
+        return plotLearningCurves(evaluation_list_p1, evaluation_list_p2)
     figure(figsize=(8,6), dpi=80)
     # Employee 1
     x1 = evaluation_list_p1.index
@@ -127,4 +136,24 @@ def fitAndPlot(evaluation_list_p1, evaluation_list_p2, a1, a2, b1, b2, c1, c2, a
     plt.plot(x_line, y_line2, ':', color='r')
     plt.xlabel("Days")
     plt.ylabel("$m_i$")
-    plt.legend(['Jessica Parker (hist.)', 'Jessica Parker (extrap.)', 'Johanna Nielsen (hist.)', 'Johanna Nielsen (extrap.)'])
\ No newline at end of file
+    plt.legend(['Jessica Parker (hist.)', 'Jessica Parker (extrap.)', 'Johanna Nielsen (hist.)', 'Johanna Nielsen (extrap.)'])
+
+def plotLearningCurves(evaluationTable, fitTable, degree=3, actors=None, names=None, extrapolate=100):
+    # historical scores (solid) and fitted curve (dotted, extrapolated by extrapolate days) per actor
+    figure(figsize=(8,6), dpi=80)
+    actors = actors if actors is not None else fitTable.loc[fitTable["degree"] == degree, "actor"].tolist()
+    names = names if names is not None else dict()
+    legend = []
+    for actor, color in zip(actors, plt.cm.tab10(np.arange(len(actors)) % 10)):
+        rows = evaluationTable[evaluationTable["actor"] == actor]
+        x = getDayIndex(rows)
+        params = fitTable[(fitTable["actor"] == actor) & (fitTable["degree"] == degree)].iloc[0]
+        plt.plot(x, rows["score"], '-', color=color)
+        x_line = np.arange(min(x), max(x)+extrapolate, 1)
+        plt.plot(x_line, evaluatePolynomial(params, x_line), ':', color=color)
+        name = names.get(actor, actor)
+        legend.extend([f"{name} (hist.)", f"{name} (extrap.)"])
+    plt.xlabel("Days")
+    plt.ylabel("$m_i$")
+    plt.legend(legend)
+    return plt
@@ -0,0 +1,99 @@
+import heapq
+from collections import deque
+import pandas as pd
+from stages.LPA.evaluation import SCORE_WEIGHTS
+
+class StreamingMedian:
+    # Running median with two heaps: a max-heap of the lower half (stored negated) and a min-heap of the
+    # upper half. add is O(log n), median is O(1) and equal to statistics.median of all added values.
+    def __init__(self):
+        self.lower = []
+        self.upper = []
+
+    def __len__(self):
+        return len(self.lower)+len(self.upper)
+
+    def add(self, value):
+        if self.lower and value > -self.lower[0]:
+            heapq.heappush(self.upper, value)
+        else:
+            heapq.heappush(self.lower, -value)
+        # keep len(lower) == len(upper) or len(upper)+1
+        if len(self.lower) > len(self.upper)+1:
+            heapq.heappush(self.upper, -heapq.heappop(self.lower))
+        elif len(self.upper) > len(self.lower):
+            heapq.heappush(self.lower, -heapq.heappop(self.upper))
+
+    def median(self):
+        if not self.lower:
+            raise ValueError("No values added yet")
+        if len(self.lower) > len(self.upper):
+            return -self.lower[0]
+        return (-self.lower[0]+self.upper[0])/2
+
+class LearningMetricTracker:
+    # Incremental version of the learning metric of getEvaluationList for cases that are closed one after the
+    # other, e.g. the closed cases returned by CaseGrouper.addChunk (after classifyMessages). Each successful
+    # case updates the streaming medians of duration, message count and headcount and is scored against the
+    # medians at that time, so earlier scores are not recomputed. Per practitioner, the scores are kept as a
+    # time series (the last window cases if window is given); the min-max normalization uses the lowest and
+    # highest score seen so far.
+    def __init__(self, actors=None, weights=SCORE_WEIGHTS, window=None, timest_format="%Y-%m-%d %H:%M:%S"):
+        self.actors = set(actors) if actors is not None else None
+        self.weights = weights
+        self.window = window
+        self.timest_format = timest_format
+        self.medians = {"duration": StreamingMedian(), "messageCount": StreamingMedian(), "headCount": StreamingMedian()}
+        self.series = dict() # actor -> deque of (date, case, duration_delta, msg_delta, headcount_delta, score)
+        self.minScore = None
+        self.maxScore = None
+
+    def addCase(self, case):
+        # returns the raw score of the case or None if the case was not successful
+        if not case.checkCaseSuccess():
+            return None
+        _, end, duration = case.getCaseDuration(self.timest_format)
+        values = {"duration": duration, "messageCount": case.getMessageCount(), "headCount": case.getHeadCount()}
+        for key, value in values.items():
+            self.medians[key].add(value)
+        deltas = {
+            "duration_delta": (self.medians["duration"].median()-duration)/(60*60),
+            "msg_delta": self.medians["messageCount"].median()-values["messageCount"],
+            "headcount_delta": self.medians["headCount"].median()-values["headCount"]
+        }
+        score = sum(weight*deltas[column] for column, weight in self.weights.items())
+        self.minScore = score if self.minScore is None else min(self.minScore, score)
+        self.maxScore = score if self.maxScore is None else max(self.maxScore, score)
+        row = (pd.Timestamp(end.date()), case.clusterId, deltas["duration_delta"], deltas["msg_delta"], deltas["headcount_delta"], score)
+        for actor in dict.fromkeys(case.actors):
+            if self.actors is None or actor in self.actors:
+                self.series.setdefault(actor, deque(maxlen=self.window)).append(row)
+        return score
+
+    def update(self, cases):
+        return [self.addCase(case) for case in cases]
+
+    def normalize(self, score):
+        if self.maxScore is None or self.maxScore == self.minScore:
+            return float("nan")
+        return (score-self.minScore)/(self.maxScore-self.minScore)
+
+    def getSeries(self, actor, normalize=True):
+        # scores of an actor in the format of getEvaluationList (date index, sorted by date); like
+        # getActorEvaluation, every case of the actor is included, also cases shared with another practitioner
+        rows = self.series.get(actor, [])
+        evaluation = pd.DataFrame(list(rows), columns=["datestr", "case", "duration_delta", "msg_delta", "headcount_delta", "score"])
+        evaluation = evaluation.set_index("datestr").drop(columns=["case"]).sort_index(kind="stable")
+        if normalize:
+            evaluation["score"] = evaluation["score"].map(self.normalize)
+        return evaluation
+
+    def getCurrentScore(self, actor, window="30D", normalize=True):
+        # mean score of the cases of the actor that ended within window before its latest case
+        series = self.getSeries(actor, normalize)["score"]
+        if series.empty:
+            return float("nan")
+        return series[series.index > series.index[-1]-pd.Timedelta(window)].mean()
+
+    def getActors(self):
+        return list(self.series)
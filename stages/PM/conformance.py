@@ -0,0 +1,147 @@
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy import stats
+
+from pm4py.objects.log.obj import EventLog
+from pm4py.statistics.variants.log import get as variants_get
+from pm4py.algo.conformance.tokenreplay import algorithm as token_replay
+from pm4py.algo.evaluation.precision import utils as precision_utils
+from pm4py.algo.evaluation.simplicity import evaluator as simplicity_evaluator
+from pm4py.objects.petri_net.utils.align_utils import get_visible_transitions_eventually_enabled_by_marking
+from pm4py.util.xes_constants import DEFAULT_NAME_KEY
+from pm4py.util import constants
+from stages.utils.profiling import profileStage
+
+def getVariantLog(log):
+    # one trace per trace variant (its first occurrence) and the number of traces per variant
+    variants = variants_get.get_variants(log)
+    variantLog = EventLog([traces[0] for traces in variants.values()])
+    counts = np.array([len(traces) for traces in variants.values()], dtype=np.int64)
+    return variantLog, counts
+
+def replayVariants(variantLog, net, im, fm):
+    # token-based replay with the settings of replay fitness and generalization (both use the defaults)
+    return token_replay.apply(variantLog, net, im, fm, parameters={
+        token_replay.Variants.TOKEN_REPLAY.value.Parameters.SHOW_PROGRESS_BAR: False
+    })
+
+def weightedFitness(alignedTraces, counts):
+    # replay_fitness token-based evaluate() with every variant counted as often as it occurs in the log
+    noTraces = counts.sum()
+    totals = {key: sum(trace[key]*count for trace, count in zip(alignedTraces, counts))
+        for key in ("missing_tokens", "consumed_tokens", "remaining_tokens", "produced_tokens")}
+    fitness = {"perc_fit_traces": 0.0, "average_trace_fitness": 0.0, "log_fitness": 0}
+    if noTraces > 0 and totals["consumed_tokens"] > 0 and totals["produced_tokens"] > 0:
+        fitTraces = sum(count for trace, count in zip(alignedTraces, counts) if trace["trace_is_fit"])
+        fitness["perc_fit_traces"] = float(100.0*fitTraces)/float(noTraces)
+        fitness["average_trace_fitness"] = float(sum(trace["trace_fitness"]*count for trace, count in zip(alignedTraces, counts)))/float(noTraces)
+        fitness["log_fitness"] = 0.5*(1-totals["missing_tokens"]/totals["consumed_tokens"])+0.5*(1-totals["remaining_tokens"]/totals["produced_tokens"])
+    fitness["percentage_of_fitting_traces"] = fitness["perc_fit_traces"]
+    return fitness
+
+def weightedGeneralization(net, alignedTraces, counts):
+    # token-based generalization, transition occurrences are counted once per trace of the variant
+    occurrences = Counter()
+    for trace, count in zip(alignedTraces, counts):
+        for transition in trace["activated_transitions"]:
+            occurrences[transition] += int(count)
+    invSqOccSum = sum(1.0/np.sqrt(occ) for occ in occurrences.values())
+    invSqOccSum += sum(1 for transition in net.transitions if transition not in occurrences)
+    if len(net.transitions) == 0:
+        return 1.0
+    return 1.0-invSqOccSum/float(len(net.transitions))
+
+def weightedPrecision(variantLog, counts, net, im, fm):
+    # ETConformance precision (token-based), prefixes are counted once per trace of their variants
+    prefixes = dict()
+    prefixCount = Counter()
+    for trace, count in zip(variantLog, counts):
+        for i in range(1, len(trace)):
+            prefix = constants.DEFAULT_VARIANT_SEP.join([x[DEFAULT_NAME_KEY] for x in trace[0:i]])
+            prefixes.setdefault(prefix, set()).add(trace[i][DEFAULT_NAME_KEY])
+            prefixCount[prefix] += int(count)
+    prefixKeys = list(prefixes.keys())
+    fakeLog = precision_utils.form_fake_log(prefixKeys)
+    parameters = token_replay.Variants.TOKEN_REPLAY.value.Parameters
+    alignedTraces = token_replay.apply(fakeLog, net, im, fm, parameters={
+        parameters.CONSIDER_REMAINING_IN_FITNESS: False,
+        parameters.TRY_TO_REACH_FINAL_MARKING_THROUGH_HIDDEN: False,
+        parameters.STOP_IMMEDIATELY_UNFIT: True,
+        parameters.WALK_THROUGH_HIDDEN_TRANS: True,
+        parameters.CLEANING_TOKEN_FLOOD: False,
+        parameters.SHOW_PROGRESS_BAR: False
+    })
+    # the empty prefix of every trace
+    startActivities = set(trace[0][DEFAULT_NAME_KEY] for trace in variantLog if len(trace) > 0)
+    enabledInitially = set(x.label for x in get_visible_transitions_eventually_enabled_by_marking(net, im))
+    sumAt = int(counts.sum())*len(enabledInitially)
+    sumEe = int(counts.sum())*len(enabledInitially.difference(startActivities))
+    for key, trace in zip(prefixKeys, alignedTraces):
+        if trace["trace_is_fit"]:
+            activated = set(x.label for x in trace["enabled_transitions_in_marking"] if x.label is not None)
+            sumAt += len(activated)*prefixCount[key]
+            sumEe += len(activated.difference(prefixes[key]))*prefixCount[key]
+    return 1-float(sumEe)/float(sumAt) if sumAt > 0 else 1.0
+
+def _fitnessAndGeneralization(variantLog, counts, net, im, fm):
+    # one replay for both metrics
+    alignedTraces = replayVariants(variantLog, net, im, fm)
+    return weightedFitness(alignedTraces, counts), weightedGeneralization(net, alignedTraces, counts)
+
+def _variantMetrics(log, net, im, fm):
+    variantLog, counts = getVariantLog(log)
+    fitness, gen = _fitnessAndGeneralization(variantLog, counts, net, im, fm)
+    return fitness, weightedPrecision(variantLog, counts, net, im, fm), gen
+
+def computeVariantMetrics(log, net, im, fm, n_workers=2, counts=None):
+    # Same values as computeMetrics, evaluated on the unique trace variants weighted by their frequency.
+    # Fitness and generalization share one replay; precision runs concurrently in a second process.
+    # With counts, log is already a variant log of getVariantLog.
+    with profileStage("conformance") as stage:
+        with profileStage("variants"):
+            variantLog, counts = getVariantLog(log) if counts is None else (log, counts)
+        stage.count(cases=int(counts.sum()), variants=len(variantLog))
+        if n_workers <= 1:
+            with profileStage("fitness_generalization"):
+                fitness, gen = _fitnessAndGeneralization(variantLog, counts, net, im, fm)
+            with profileStage("precision"):
+                prec = weightedPrecision(variantLog, counts, net, im, fm)
+        else:
+            with ProcessPoolExecutor(max_workers=2) as pool:
+                replay = pool.submit(_fitnessAndGeneralization, variantLog, counts, net, im, fm)
+                precision = pool.submit(weightedPrecision, variantLog, counts, net, im, fm)
+                fitness, gen = replay.result()
+                prec = precision.result()
+        simp = simplicity_evaluator.apply(net)
+    return fitness, prec, gen, simp
+
+def computeSampledMetrics(log, net, im, fm, sampleSize=1000, batches=5, confidence=0.95, seed=0, n_workers=4):
+    # Estimates for very large logs: a random sample of traces is split into batches, the metrics are computed
+    # per batch in parallel and reported as mean with a t-distribution confidence interval over the batches.
+    # Returns {metric: (estimate, low, high)} for log fitness, precision and generalization and the simplicity.
+    # Generalization depends on how often transitions are replayed, so it is underestimated on small batches.
+    indices = random.Random(seed).sample(range(len(log)), min(sampleSize, len(log)))
+    batchLogs = [EventLog([log[i] for i in indices[b::batches]]) for b in range(batches)]
+    batchLogs = [batchLog for batchLog in batchLogs if len(batchLog) > 0]
+    if n_workers <= 1:
+        results = [_variantMetrics(batchLog, net, im, fm) for batchLog in batchLogs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(_variantMetrics, batchLogs, *[[x]*len(batchLogs) for x in (net, im, fm)]))
+    values = {
+        "fitness": np.array([fitness["log_fitness"] for fitness, _, _ in results]),
+        "precision": np.array([prec for _, prec, _ in results]),
+        "generalization": np.array([gen for _, _, gen in results])
+    }
+    estimates = dict()
+    for metric, batchValues in values.items():
+        mean = float(batchValues.mean())
+        if len(batchValues) > 1:
+            halfWidth = stats.t.ppf((1+confidence)/2, len(batchValues)-1)*batchValues.std(ddof=1)/np.sqrt(len(batchValues))
+        else:
+            halfWidth = float("nan")
+        estimates[metric] = (mean, mean-halfWidth, mean+halfWidth)
+    estimates["simplicity"] = simplicity_evaluator.apply(net)
+    return estimates
@@ -0,0 +1,106 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+import pandas as pd
+
+from pm4py.algo.discovery.dfg import algorithm as dfg_alg
+from pm4py.algo.discovery.heuristics.variants import classic as heuristics_classic
+from pm4py.objects.conversion.heuristics_net import converter as hn_conv_alg
+from pm4py.statistics.attributes.log import get as log_attributes
+from pm4py.statistics.end_activities.log import get as log_ea_filter
+from pm4py.statistics.start_activities.log import get as log_sa_filter
+from pm4py.util.xes_constants import DEFAULT_NAME_KEY
+from stages.PM.conformance import getVariantLog, computeVariantMetrics
+from stages.utils.profiling import profiled
+
+# thresholds of heuristicsMiner, keys are the heuristics miner parameter names
+HEURISTICS_CONFIG = {
+    "dependency_thresh": 0.05,
+    "min_act_count": 4,
+    "and_measure_thresh": 0.95,
+    "min_dfg_occurrences": 4,
+    "dfg_pre_cleaning_noise_thresh": 0.75
+}
+
+def getDiscoveryStatistics(log):
+    # directly-follows graphs, activity counts and start/end activities as computed by the heuristics miner
+    activitiesOccurrences = log_attributes.get_attribute_values(log, DEFAULT_NAME_KEY)
+    return {
+        "dfg": dfg_alg.apply(log),
+        "activities": list(activitiesOccurrences.keys()),
+        "activities_occurrences": activitiesOccurrences,
+        "start_activities": log_sa_filter.get_start_activities(log),
+        "end_activities": log_ea_filter.get_end_activities(log),
+        "dfg_window_2": dfg_alg.apply(log, parameters={"window": 2}),
+        "freq_triples": dfg_alg.apply(log, variant=dfg_alg.Variants.FREQ_TRIPLES)
+    }
+
+def discoverHeuristicsNet(statistics, config=HEURISTICS_CONFIG):
+    # heuristics net of the cached statistics; the statistics are copied since the miner cleans the dfg in place
+    return heuristics_classic.apply_heu_dfg(**deepcopy(statistics), parameters=dict(config))
+
+def discoverPetriNet(statistics, config=HEURISTICS_CONFIG):
+    # same result as heuristics_miner.apply(log, parameters=config)
+    return hn_conv_alg.apply(discoverHeuristicsNet(statistics, config), parameters=dict(config))
+
+def expandGrid(grid):
+    # grid maps threshold names to lists of values, missing ones use HEURISTICS_CONFIG
+    keys = list(grid)
+    configs = []
+    for values in itertools.product(*[grid[key] for key in keys]):
+        config = dict(HEURISTICS_CONFIG)
+        config.update(zip(keys, values))
+        configs.append(config)
+    return configs
+
+# statistics and variant log shared with the worker processes, set once per worker by the pool initializer
+_shared = None
+
+def _initWorker(shared):
+    global _shared
+    _shared = shared
+
+def evaluateConfig(config, shared=None):
+    shared = shared if shared is not None else _shared
+    net, im, fm = discoverPetriNet(shared["statistics"], config)
+    fitness, prec, gen, simp = computeVariantMetrics(shared["variantLog"], net, im, fm, n_workers=1, counts=shared["counts"])
+    return {
+        "config": config,
+        "fitness": fitness["log_fitness"],
+        "precision": prec,
+        "generalization": gen,
+        "simplicity": simp,
+        "places": len(net.places),
+        "transitions": len(net.transitions),
+        "arcs": len(net.arcs)
+    }
+
+class DiscoverySweep:
+    # Heuristics miner over a grid of thresholds. The log statistics and the trace variants are computed once,
+    # every configuration derives its net from them and is evaluated in a worker process.
+    def __init__(self, log, n_workers=4):
+        variantLog, counts = getVariantLog(log)
+        self.shared = {"statistics": getDiscoveryStatistics(log), "variantLog": variantLog, "counts": counts}
+        self.n_workers = n_workers
+
+    @profiled("discovery_sweep", counts=lambda results, *args, **kwargs: {"configs": len(results)})
+    def run(self, grid, verbose=True):
+        configs = expandGrid(grid)
+        if self.n_workers <= 1:
+            results = [evaluateConfig(config, self.shared) for config in configs]
+        else:
+            with ProcessPoolExecutor(max_workers=self.n_workers, initializer=_initWorker, initargs=(self.shared,)) as pool:
+                results = list(pool.map(evaluateConfig, configs))
+        rows = []
+        for result in results:
+            row = dict(result.pop("config"))
+            row.update(result)
+            rows.append(row)
+            if verbose:
+                print(row)
+        return pd.DataFrame(rows)
+
+    def getModel(self, config):
+        # Petri net of a configuration, e.g. the best one of the sweep
+        config = dict(HEURISTICS_CONFIG, **{key: value for key, value in config.items() if key in HEURISTICS_CONFIG})
+        return discoverPetriNet(self.shared["statistics"], config)
@@ -12,12 +12,29 @@ from pm4py.objects.conversion.log import converter as log_converter
 from pm4py.visualization.heuristics_net import visualizer as hn_visualizer
 from pm4py.visualization.petrinet import visualizer as pn_visualizer
 from pm4py.vis import save_vis_heuristics_net
+from stages.utils.profiling import profiled, profileStage
     
 
 def importCSVToLog(filepath):
     event_log = pd.read_csv(filepath, sep=';')
     event_log = dataframe_utils.convert_timestamp_columns_in_df(event_log, timest_format="%Y-%m-%d %H:%M:%S", timest_columns="Date")
-    event_log = pm4py.format_dataframe(event_log, case_id='Case', activity_key='Action', timestamp_key='Date', timest_format="%Y-%m-%d %H:%M:%S")
+    return dataFrameToLog(event_log)
+
+def importParquetToLog(filepath):
+    # Date is stored as timestamp column, no parsing needed
+    event_log = pd.read_parquet(filepath)
+    return dataFrameToLog(event_log)
+
+def importEventLog(filepath):
+    if filepath.endswith(".parquet"):
+        return importParquetToLog(filepath)
+    return importCSVToLog(filepath)
+
+@profiled("import_log", counts=lambda log, event_log: {"events": len(event_log), "cases": len(log)})
+def dataFrameToLog(event_log):
+    # event_log with Case, Action and Date columns, e.g. from CasesList.toEventLog; Date columns that
+    # are already timestamps are not parsed again
+    event_log = pm4py.format_dataframe(event_log.copy(), case_id='Case', activity_key='Action', timestamp_key='Date', timest_format="%Y-%m-%d %H:%M:%S")
     log = log_converter.apply(event_log)
     
     num_events = len(event_log)
@@ -25,7 +42,11 @@ def importCSVToLog(filepath):
     print(f"Imported {num_events} events with {num_cases} cases.")
     return log
 
-def heuristicsMiner(log):
+@profiled("discovery", counts=lambda model, log, *args, **kwargs: {"cases": len(log), "transitions": len(model[0].transitions)})
+def heuristicsMiner(log, config=None):
+    if config is not None:
+        # thresholds by parameter name, e.g. a row of DiscoverySweep.run
+        return heuristics_miner.apply(log, parameters=dict(config))
     net, im, fm = heuristics_miner.apply(
         log,
         parameters={
@@ -38,26 +59,36 @@ def heuristicsMiner(log):
     )
     return net, im, fm
 
-def previewAndSave(log, net, im, fm):
+def previewAndSave(log, net, im, fm, renderer=None):
+    if renderer is not None:
+        # layout once, svg and png written in the background (see stages/PM/rendering.py)
+        return renderer.renderPetriNet(net, im, fm, "heu1", log=log, formats=("svg", "png"))
     gviz = pn_visualizer.apply(net, im, fm, variant=pn_visualizer.Variants.FREQUENCY, log=log, parameters={"format": "svg"})
     gviz_vis = pn_visualizer.apply(net, im, fm, variant=pn_visualizer.Variants.FREQUENCY, log=log, parameters={"format": "png"})
     pn_visualizer.view(gviz_vis)
     pn_visualizer.save(gviz, "heu1.svg")
 
 def computeMetrics(log, net, im, fm):
-    fitness = replay_fitness_evaluator.apply(log, net, im, fm, variant=replay_fitness_evaluator.Variants.TOKEN_BASED)
-    prec = precision_evaluator.apply(log, net, im, fm, variant=precision_evaluator.Variants.ETCONFORMANCE_TOKEN)
-    gen = generalization_evaluator.apply(log, net, im, fm)
-    simp = simplicity_evaluator.apply(net)
+    with profileStage("conformance", cases=len(log)):
+        with profileStage("fitness"):
+            fitness = replay_fitness_evaluator.apply(log, net, im, fm, variant=replay_fitness_evaluator.Variants.TOKEN_BASED)
+        with profileStage("precision"):
+            prec = precision_evaluator.apply(log, net, im, fm, variant=precision_evaluator.Variants.ETCONFORMANCE_TOKEN)
+        with profileStage("generalization"):
+            gen = generalization_evaluator.apply(log, net, im, fm)
+        with profileStage("simplicity"):
+            simp = simplicity_evaluator.apply(net)
     return fitness, prec, gen, simp
 
-def previewAndSaveHeuristicsNet(log):
+def previewAndSaveHeuristicsNet(log, renderer=None):
     parameters = {
         heuristics_miner.Variants.CLASSIC.value.Parameters.DEPENDENCY_THRESH.MIN_DFG_OCCURRENCES: 3,
         heuristics_miner.Variants.CLASSIC.value.Parameters.DEPENDENCY_THRESH.MIN_ACT_COUNT: 3,
         heuristics_miner.Variants.CLASSIC.value.Parameters.DEPENDENCY_THRESH.DFG_PRE_CLEANING_NOISE_THRESH: 0.1
     }
     heu_net = heuristics_miner.apply_heu(log, parameters=parameters)
+    if renderer is not None:
+        return renderer.renderHeuristicsNet(heu_net, "heu1_net", formats=("png",))
     gviz = hn_visualizer.apply(heu_net, parameters={"format": "png"})
     hn_visualizer.view(gviz)
     save_vis_heuristics_net(heu_net, "heu1_net.png")
\ No newline at end of file
@@ -0,0 +1,82 @@
+from os import path, makedirs
+from concurrent.futures import ThreadPoolExecutor
+import graphviz
+
+from pm4py.visualization.petrinet import visualizer as pn_visualizer
+from pm4py.visualization.heuristics_net import visualizer as hn_visualizer
+from pm4py.visualization.heuristics_net.variants import pydotplus_vis
+
+def getPetriNetSource(net, im, fm, log=None):
+    # DOT source of the frequency-decorated Petri net, as drawn by previewAndSave
+    return pn_visualizer.apply(net, im, fm, variant=pn_visualizer.Variants.FREQUENCY, log=log).source
+
+def getHeuristicsNetSource(heu_net):
+    return pydotplus_vis.get_graph(heu_net).to_string()
+
+def computeLayout(source):
+    # runs the dot layout once, the result is DOT source with the positions of all nodes and edges
+    return graphviz.Source(source, engine="dot").pipe(format="dot", encoding="utf-8")
+
+def renderLayout(layout, filePath, formats=("svg", "png")):
+    # writes filePath.<format> per format from a computed layout; neato -n2 keeps the positions and only draws
+    files = []
+    for format in formats:
+        fileName = f"{filePath}.{format}"
+        with open(fileName, "wb") as f:
+            f.write(graphviz.Source(layout, engine="neato").pipe(format=format, neato_no_op=2))
+        files.append(fileName)
+    return files
+
+def renderGraph(source, filePath, formats=("svg", "png")):
+    return renderLayout(computeLayout(source), filePath, formats)
+
+class Renderer:
+    # Renders process models in a background thread, so mining and metrics continue meanwhile. The layout is
+    # computed once per model and written in all requested formats to outDir. In headless mode, files are only
+    # written; otherwise wait() previews the PNG of each model. Models with more than maxElements
+    # places, transitions and arcs (nodes and edges for heuristics nets) are skipped.
+    def __init__(self, outDir=".", headless=False, maxElements=None, n_workers=1):
+        self.outDir = outDir
+        self.headless = headless
+        self.maxElements = maxElements
+        self.executor = ThreadPoolExecutor(max_workers=n_workers)
+        self.pending = []
+        if outDir:
+            makedirs(outDir, exist_ok=True)
+
+    def _tooLarge(self, size):
+        return self.maxElements is not None and size > self.maxElements
+
+    def _submit(self, getSource, name, formats):
+        future = self.executor.submit(lambda: renderGraph(getSource(), path.join(self.outDir, name), formats))
+        self.pending.append((future, name))
+        return future
+
+    def renderPetriNet(self, net, im, fm, name="heu1", log=None, formats=("svg", "png")):
+        # returns a Future with the written files, None if the net was skipped
+        if self._tooLarge(len(net.places)+len(net.transitions)+len(net.arcs)):
+            print(f"Skipped rendering of {name}: net exceeds {self.maxElements} elements")
+            return None
+        return self._submit(lambda: getPetriNetSource(net, im, fm, log), name, formats)
+
+    def renderHeuristicsNet(self, heu_net, name="heu1_net", formats=("png",)):
+        size = len(heu_net.nodes)+sum(len(node.output_connections) for node in heu_net.nodes.values())
+        if self._tooLarge(size):
+            print(f"Skipped rendering of {name}: net exceeds {self.maxElements} elements")
+            return None
+        return self._submit(lambda: getHeuristicsNetSource(heu_net), name, formats)
+
+    def wait(self):
+        # waits for all pending renderings and returns the written files per model name
+        results = dict()
+        for future, name in self.pending:
+            results[name] = future.result()
+            previews = [f for f in results[name] if f.endswith(".png")]
+            if not self.headless and previews:
+                hn_visualizer.view(previews[0])
+        self.pending = []
+        return results
+
+    def close(self):
+        self.wait()
+        self.executor.shutdown()
@@ -0,0 +1,111 @@
+import numpy as np
+import gensim
+from gensim.matutils import corpus2csc
+from stages.utils.profiling import profiled
+
+# Topic model backends of the labelling step. A backend is trained on a BoW corpus with fit(corpus, id2word) and
+# infers topic weights with inference(bows) -> (weights per document and topic, None), the interface of
+# gensim's LdaModel.inference, so stages/TM/topics.py (detectLabels, inferTopicLabels) and
+# CasesList.classifyMessages accept a backend in place of an LdaModel. All backends take the settings of
+# DEFAULT_LDA_CONFIG (stages/TM/ldasweep.py) and ignore the ones they do not support.
+
+def countDocuments(backend, self, corpus, *args, **kwargs):
+    return {"messages": len(corpus)}
+
+class GensimLdaBackend:
+    # single-core gensim LdaModel, the model of main.ipynb and the parameter study; workers is not used
+    def __init__(self, num_topics=10, workers=None, **params):
+        self.num_topics = num_topics
+        self.workers = workers
+        self.params = params
+        self.model = None
+        self.id2word = None
+
+    def createModel(self, corpus, id2word):
+        return gensim.models.ldamodel.LdaModel(corpus=corpus, id2word=id2word, num_topics=self.num_topics, **self.params)
+
+    @profiled("topic_model_fit", counts=countDocuments)
+    def fit(self, corpus, id2word):
+        self.id2word = id2word
+        self.model = self.createModel(corpus, id2word)
+        return self
+
+    def inference(self, bows):
+        return self.model.inference(bows)
+
+class LdaMulticoreBackend(GensimLdaBackend):
+    # gensim LdaMulticore with workers training processes (None: number of cores - 1). LdaMulticore has no
+    # update_every and does not learn an asymmetric alpha, alpha "auto" is trained as "symmetric".
+    def createModel(self, corpus, id2word):
+        params = {key: value for key, value in self.params.items() if key != "update_every"}
+        if params.get("alpha") == "auto":
+            params["alpha"] = "symmetric"
+        return gensim.models.ldamulticore.LdaMulticore(corpus=corpus, id2word=id2word, num_topics=self.num_topics,
+            workers=self.workers, **params)
+
+class SklearnBackend:
+    # NMF or LDA of scikit-learn on the sparse document-term matrix of the corpus. NMF is trained on tf-idf
+    # weights (fast and deterministic for short messages), LDA online on term counts with passes as number of
+    # iterations, chunksize as batch size and workers parallel jobs.
+    def __init__(self, method="nmf", num_topics=10, workers=None, random_state=None, passes=10, chunksize=100, alpha=None,
+            max_iter=None, **params):
+        self.method = method
+        self.num_topics = num_topics
+        self.workers = workers
+        self.random_state = random_state
+        self.passes = passes
+        self.chunksize = chunksize
+        # only a numeric alpha is passed as doc_topic_prior, "auto" and "symmetric" use the default 1/num_topics
+        self.alpha = alpha if isinstance(alpha, (int, float)) else None
+        self.max_iter = max_iter
+        self.model = None
+        self.tfidf = None
+        self.id2word = None
+
+    def toMatrix(self, bows):
+        # documents x terms, terms that are not in the dictionary of the model are dropped by doc2bow already
+        return corpus2csc(bows, num_terms=len(self.id2word), num_docs=len(bows), dtype=np.float64).T.tocsr()
+
+    @profiled("topic_model_fit", counts=countDocuments)
+    def fit(self, corpus, id2word):
+        from sklearn.decomposition import NMF, LatentDirichletAllocation
+        from sklearn.feature_extraction.text import TfidfTransformer
+        self.id2word = id2word
+        matrix = self.toMatrix(corpus)
+        if self.method == "nmf":
+            self.tfidf = TfidfTransformer().fit(matrix)
+            self.model = NMF(n_components=self.num_topics, init="nndsvda", random_state=self.random_state,
+                max_iter=self.max_iter or 200)
+            self.model.fit(self.tfidf.transform(matrix))
+        elif self.method == "lda":
+            self.model = LatentDirichletAllocation(n_components=self.num_topics, doc_topic_prior=self.alpha,
+                learning_method="online", batch_size=self.chunksize, max_iter=self.max_iter or self.passes,
+                random_state=self.random_state, n_jobs=self.workers)
+            self.model.fit(matrix)
+        else:
+            raise ValueError(f"Unknown scikit-learn topic model {self.method}")
+        return self
+
+    def inference(self, bows):
+        matrix = self.toMatrix(bows)
+        if self.tfidf is not None:
+            matrix = self.tfidf.transform(matrix)
+        return self.model.transform(matrix), None
+
+TOPIC_MODEL_BACKENDS = {
+    "lda": GensimLdaBackend,
+    "multicore": LdaMulticoreBackend,
+    "nmf": lambda **params: SklearnBackend("nmf", **params),
+    "sklearn_lda": lambda **params: SklearnBackend("lda", **params)
+}
+
+def createBackend(name="lda", **params):
+    if name not in TOPIC_MODEL_BACKENDS:
+        raise ValueError(f"Unknown topic model backend {name}, available: {', '.join(TOPIC_MODEL_BACKENDS)}")
+    return TOPIC_MODEL_BACKENDS[name](**params)
+
+def trainTopicModel(texts, backend="lda", **params):
+    # dictionary and trained backend for token lists
+    id2word = gensim.corpora.Dictionary(texts)
+    corpus = [id2word.doc2bow(text) for text in texts]
+    return createBackend(backend, **params).fit(corpus, id2word), id2word
@@ -0,0 +1,117 @@
+import hashlib, json, sqlite3, time, zlib
+from os import path, makedirs, getpid
+from pathlib import Path
+import spacy
+
+# cache of lemmatize and gen_words when no cache is passed
+DEFAULT_CACHE_FILE = path.join("out", "cache", "tokens.sqlite")
+
+class TokenCache:
+    # Persistent cache of token lists in a SQLite file. Entries are keyed by a hash of the text and the
+    # preprocessing configuration (model and version, POS tags, options), so changed messages or settings
+    # never hit stale entries. Token lists are stored as compressed JSON; once the cache grows beyond
+    # maxBytes, the least recently used entries are evicted.
+    def __init__(self, filePath, maxBytes=512*1024*1024):
+        directory = path.dirname(filePath)
+        if directory:
+            makedirs(directory, exist_ok=True)
+        self.maxBytes = maxBytes
+        self.connection = sqlite3.connect(filePath)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS tokens (key BLOB PRIMARY KEY, value BLOB, size INTEGER, accessed REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS tokens_accessed ON tokens (accessed)")
+        self.connection.commit()
+
+    @staticmethod
+    def key(text, config):
+        return hashlib.sha256(json.dumps([config, text]).encode("utf-8")).digest()
+
+    def getMany(self, keys):
+        keys = list(keys)
+        hits = dict()
+        # stay below the SQLite limit of host parameters per statement
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i+500]
+            rows = self.connection.execute(
+                f"SELECT key, value FROM tokens WHERE key IN ({','.join('?'*len(chunk))})", chunk).fetchall()
+            for key, value in rows:
+                hits[key] = json.loads(zlib.decompress(value))
+        if hits:
+            now = time.time()
+            self.connection.executemany("UPDATE tokens SET accessed = ? WHERE key = ?", [(now, key) for key in hits])
+            self.connection.commit()
+        return hits
+
+    def putMany(self, items):
+        now = time.time()
+        rows = []
+        for key, tokens in items:
+            value = zlib.compress(json.dumps(tokens).encode("utf-8"))
+            rows.append((key, value, len(value), now))
+        self.connection.executemany("INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?)", rows)
+        self.connection.commit()
+        self.evict()
+
+    def getSize(self):
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM tokens").fetchone()[0]
+
+    def evict(self):
+        # delete least recently used entries until the cache is below 90% of maxBytes
+        size = self.getSize()
+        if size <= self.maxBytes:
+            return
+        target = size - int(self.maxBytes*0.9)
+        removed = 0
+        keys = []
+        for key, entrySize in self.connection.execute("SELECT key, size FROM tokens ORDER BY accessed"):
+            keys.append((key,))
+            removed += entrySize
+            if removed >= target:
+                break
+        self.connection.executemany("DELETE FROM tokens WHERE key = ?", keys)
+        self.connection.commit()
+
+    def clear(self):
+        self.connection.execute("DELETE FROM tokens")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+def getModelVersion(model):
+    # version of an installed model package or of a model directory, together with the spaCy version
+    version = spacy.util.get_package_version(model)
+    if version is None and Path(model, "meta.json").exists():
+        version = spacy.util.load_meta(Path(model, "meta.json")).get("version")
+    return f"{model}=={version}/spacy=={spacy.__version__}"
+
+# default caches per process, a SQLite connection must not be shared with forked processes
+_defaultCaches = dict()
+
+def getDefaultCache():
+    pid = getpid()
+    if pid not in _defaultCaches:
+        _defaultCaches[pid] = TokenCache(DEFAULT_CACHE_FILE)
+    return _defaultCaches[pid]
+
+def resolveCache(cache):
+    # cache argument of lemmatize and gen_words: None for the default cache, False for no cache
+    if cache is None:
+        return getDefaultCache()
+    return cache if cache is not False else None
+
+def cachedApply(cache, config, texts, compute):
+    # returns compute(texts) but only computes the texts that are not in the cache yet,
+    # compute maps a list of texts to a list of token lists; cache None or False computes all texts
+    if cache is None or cache is False:
+        return compute(list(texts))
+    keys = [cache.key(text, config) for text in texts]
+    results = cache.getMany(set(keys))
+    missing = dict()
+    for key, text in zip(keys, texts):
+        if key not in results:
+            missing.setdefault(key, text)
+    if missing:
+        computed = compute(list(missing.values()))
+        cache.putMany(zip(missing.keys(), computed))
+        results.update(zip(missing.keys(), computed))
+    return [results[key] for key in keys]
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+class CaseStatistics:
+    # Per-case aggregates of a CasesList as NumPy columns: start and end (epoch seconds), duration (seconds),
+    # messageCount and headCount. Medians and other distribution statistics are computed over all cases or
+    # over a subset, given as boolean mask or index array in the order of the CasesList.
+    columns = ("start", "end", "duration", "messageCount", "headCount")
+
+    def __init__(self, cases, timest_format="%Y-%m-%d %H:%M:%S"):
+        n = len(cases)
+        self.start = np.empty(n, dtype=np.int64)
+        self.end = np.empty(n, dtype=np.int64)
+        self.messageCount = np.empty(n, dtype=np.int64)
+        self.headCount = np.empty(n, dtype=np.int64)
+        for i, case in enumerate(cases):
+            # time ranges are cached per case, so only new or extended cases are evaluated again
+            self.start[i], self.end[i] = case.getTimeRange(timest_format)
+            self.messageCount[i] = case.getMessageCount()
+            self.headCount[i] = case.getHeadCount()
+        self.duration = (self.end-self.start).astype(np.float64)
+
+    def __len__(self):
+        return len(self.start)
+
+    def getColumn(self, column, subset=None):
+        if column not in self.columns:
+            raise ValueError(f"Unknown case statistic {column}, use one of {self.columns}")
+        values = getattr(self, column)
+        return values if subset is None else values[np.asarray(subset)]
+
+    def median(self, column, subset=None):
+        return float(np.median(self.getColumn(column, subset)))
+
+    def quantiles(self, column, q, subset=None):
+        return np.quantile(self.getColumn(column, subset), q)
+
+    def toDataFrame(self, subset=None):
+        return pd.DataFrame({column: self.getColumn(column, subset) for column in self.columns})
+
+    def describe(self, subset=None):
+        return self.toDataFrame(subset).describe()
@@ -0,0 +1,115 @@
+from os import path
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from stages.utils.profiling import profiled
+
+EVENT_LOG_FORMATS = ("csv", "parquet")
+
+def getEventLogFrame(cases, topicLabels):
+    # Case/Date/Action columns of all messages, built at once. Date holds the formatted date strings of the
+    # messages, Timestamp the parsed dates as UTC datetime64 like pm4py converts the Date strings.
+    from stages.TM.textmining import Message
+    caseIds = []
+    dates = []
+    timestamps = []
+    labels = []
+    for case in cases:
+        for m in case.messages:
+            caseIds.append(case.clusterId)
+            dates.append(m.meta["Datetime"])
+            timestamps.append(m.getTimestamp())
+            labels.append(m.detectedLabel)
+    # map each distinct detected label only once
+    actions = {label: Message.mapDetectedCategory(label, topicLabels) for label in set(labels)}
+    return pd.DataFrame({
+        "Case": caseIds,
+        "Date": dates,
+        "Action": [actions[label] for label in labels],
+        "Timestamp": pd.to_datetime(np.array(timestamps, dtype=np.int64), unit="s", utc=True)
+    })
+
+def getDebugLogFrame(cases):
+    rows = {"Date": [], "Subject": [], "Content": [], "DetectedLabel": [], "TrainLabel": []}
+    for case in cases:
+        for m in case.messages:
+            rows["Date"].append(m.meta["Datetime"])
+            rows["Subject"].append(m.subject)
+            rows["Content"].append(m.content)
+            rows["DetectedLabel"].append(m.detectedLabel)
+            rows["TrainLabel"].append(m.trainLabel)
+    return pd.DataFrame(rows)
+
+def toTypedFrame(eventLog):
+    # Case/Date/Action with Date as timestamps, ready for pm4py.format_dataframe without parsing
+    return eventLog[["Case", "Timestamp", "Action"]].rename(columns={"Timestamp": "Date"})
+
+def toWritableFrame(eventLog, format):
+    # CSV keeps the date strings of the original event logs, Parquet the typed timestamps
+    if format == "csv":
+        return eventLog[["Case", "Date", "Action"]]
+    return toTypedFrame(eventLog)
+
+class EventLogWriter:
+    # Writes an event log chunk by chunk to one file, e.g. the closed cases of a CaseGrouper.
+    # CSV files are appended with the header written once, Parquet files get one row group per chunk.
+    def __init__(self, filePath, format="csv"):
+        if format not in EVENT_LOG_FORMATS:
+            raise ValueError(f"Unknown event log format {format}, use one of {EVENT_LOG_FORMATS}")
+        self.filePath = filePath
+        self.format = format
+        self.headerWritten = False
+        self.parquetWriter = None
+
+    def write(self, eventLog):
+        frame = toWritableFrame(eventLog, self.format)
+        if self.format == "csv":
+            frame.to_csv(self.filePath, index=False, sep=";", mode="a" if self.headerWritten else "w",
+                header=not self.headerWritten)
+            self.headerWritten = True
+        else:
+            # pyarrow is only needed for Parquet output
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self.parquetWriter is None:
+                self.parquetWriter = pq.ParquetWriter(self.filePath, table.schema)
+            self.parquetWriter.write_table(table)
+
+    def close(self):
+        if self.parquetWriter is not None:
+            self.parquetWriter.close()
+            self.parquetWriter = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+@profiled("export_eventlog", counts=lambda fileName, eventLog, *args, **kwargs: {"events": len(eventLog)})
+def writeEventLog(eventLog, filePath, format="csv", chunksize=None):
+    # writes a complete event log frame, optionally in chunks of rows
+    chunksize = chunksize or max(len(eventLog), 1)
+    with EventLogWriter(filePath, format) as writer:
+        for start in range(0, max(len(eventLog), 1), chunksize):
+            writer.write(eventLog.iloc[start:start+chunksize])
+    return path.basename(filePath)
+
+# single background thread, so artifacts are written in the order they were requested
+_artifactWriter = None
+
+def writeEventLogAsync(eventLog, filePath, format="csv", chunksize=None):
+    # writes the event log in a background thread and returns a Future with the file name
+    global _artifactWriter
+    if _artifactWriter is None:
+        _artifactWriter = ThreadPoolExecutor(max_workers=1)
+    return _artifactWriter.submit(writeEventLog, eventLog, filePath, format, chunksize)
+
+def readEventLog(filePath):
+    # reads an event log written by writeEventLog, Date is UTC datetime64 for both formats
+    if filePath.endswith(".parquet"):
+        return pd.read_parquet(filePath)
+    eventLog = pd.read_csv(filePath, sep=";")
+    eventLog["Date"] = pd.to_datetime(eventLog["Date"], format="%Y-%m-%d %H:%M:%S", utc=True)
+    return eventLog
@@ -0,0 +1,113 @@
+SECONDS_PER_DAY = 24*60*60
+
+class ActorTimeIndex:
+    # Index of messages by actor and day to find candidate cases for messages without In-Reply-To.
+    # A message matches a case if one of the case's messages shares an actor (from/to) and
+    # abs((other-msg).days) <= maxDays. As timedelta.days is floored, this corresponds to
+    # -maxDays days <= other-msg < (maxDays+1) days.
+    # Each (actor, day) bucket keeps the min/max timestamp per case, so a lookup only visits
+    # the buckets within the time window instead of all messages of all cases.
+    def __init__(self, maxDays):
+        self.maxDays = maxDays
+        self.buckets = dict()
+
+    def add(self, actors, timestamp, caseIdx):
+        day = timestamp // SECONDS_PER_DAY
+        for actor in set(actors):
+            bucket = self.buckets.get((actor, day))
+            if bucket is None:
+                bucket = self.buckets[(actor, day)] = dict()
+            bounds = bucket.get(caseIdx)
+            if bounds is None:
+                bucket[caseIdx] = [timestamp, timestamp]
+            elif timestamp < bounds[0]:
+                bounds[0] = timestamp
+            elif timestamp > bounds[1]:
+                bounds[1] = timestamp
+
+    def findCase(self, actors, timestamp):
+        # returns the lowest (i.e. oldest) case index with a matching message or None
+        lower = timestamp - self.maxDays*SECONDS_PER_DAY
+        upper = timestamp + (self.maxDays+1)*SECONDS_PER_DAY
+        best = None
+        for actor in set(actors):
+            for day in range(lower // SECONDS_PER_DAY, (upper-1) // SECONDS_PER_DAY + 1):
+                bucket = self.buckets.get((actor, day))
+                if not bucket:
+                    continue
+                for caseIdx, (minTs, maxTs) in bucket.items():
+                    if (best is None or caseIdx < best) and maxTs >= lower and minTs < upper:
+                        best = caseIdx
+        return best
+
+    def remove(self, actors, timestamp, caseIdx):
+        # removes a case from the buckets of one of its messages, e.g. when the case is closed
+        day = timestamp // SECONDS_PER_DAY
+        for actor in set(actors):
+            bucket = self.buckets.get((actor, day))
+            if bucket is None or bucket.pop(caseIdx, None) is None or bucket:
+                continue
+            del self.buckets[(actor, day)]
+
+class MessageIdIndex(dict):
+    # Message-ID -> indices of the cases containing a message with this id (ids may be duplicated)
+    def add(self, messageId, caseIdx):
+        cases = self.setdefault(messageId, [])
+        if caseIdx not in cases:
+            cases.append(caseIdx)
+
+    def findCase(self, messageId):
+        # lowest case index containing a message with this id or None
+        cases = self.get(messageId)
+        return min(cases) if cases else None
+
+    def remove(self, messageId, caseIdx):
+        cases = self.get(messageId)
+        if cases is not None and caseIdx in cases:
+            cases.remove(caseIdx)
+            if not cases:
+                del self[messageId]
+
+class ThreadIndex:
+    # Union-find over messages linked by In-Reply-To, independent of the order in which messages arrive.
+    # Replies to a not (yet) known Message-ID wait in pending until the parent arrives, which then joins
+    # all partial threads that reference it.
+    def __init__(self):
+        self.parent = []
+        self.size = []
+        self.messageIds = dict() # Message-ID -> index of first message with this id
+        self.pending = dict() # Message-ID of missing parent -> indices of replies
+
+    def find(self, idx):
+        while self.parent[idx] != idx:
+            # path halving
+            self.parent[idx] = self.parent[self.parent[idx]]
+            idx = self.parent[idx]
+        return idx
+
+    def union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+    def add(self, messageId, inReplyTo=None):
+        # adds a message and links it to its parent and to already known replies, returns the message index
+        idx = len(self.parent)
+        self.parent.append(idx)
+        self.size.append(1)
+        if inReplyTo is not None:
+            parentIdx = self.messageIds.get(inReplyTo)
+            if parentIdx is not None:
+                self.union(idx, parentIdx)
+            else:
+                self.pending.setdefault(inReplyTo, []).append(idx)
+        if messageId not in self.messageIds:
+            self.messageIds[messageId] = idx
+            for reply in self.pending.pop(messageId, []):
+                self.union(reply, idx)
+        return idx
@@ -0,0 +1,135 @@
+import itertools, json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os import path, makedirs
+import numpy as np
+import pandas as pd
+import gensim
+import gensim.corpora
+from stages.utils.profiling import profiled
+from stages.utils.pipeline import hashConfig
+from stages.TM.topics import INTERNAL_LABEL, internalMask, inferTopicLabels, classificationQuota
+from stages.TM.backends import createBackend
+
+# LdaModel settings of the parameter study, every setting can be swept
+DEFAULT_LDA_CONFIG = {
+    "num_topics": 10,
+    "random_state": 100,
+    "update_every": 1,
+    "chunksize": 100,
+    "passes": 10,
+    "alpha": "auto"
+}
+
+def prepareSweepCorpus(casesList, variants):
+    # Builds dictionary, training BoW corpus and evaluation BoWs once per preprocessing variant.
+    # variants maps a variant name to the preprocessed token lists of all messages (order of getCorpora).
+    messages = casesList.getMessages()
+    rawTexts = [f"{m.subject} {m.content}".split() for m in messages]
+    shared = {
+        "internal": internalMask([m.from_ for m in messages], [m.to for m in messages]),
+        "trainLabels": [m.trainLabel for m in messages],
+        "variants": dict()
+    }
+    for name, texts in variants.items():
+        id2word = gensim.corpora.Dictionary(texts)
+        variant = {
+            "id2word": id2word,
+            "corpus": [id2word.doc2bow(text) for text in texts],
+            # evaluation uses the raw message text like the labelling step of the pipeline
+            "evaluation": [id2word.doc2bow(text) for text in rawTexts]
+        }
+        # results are only reused for the same data: dictionary, corpora, labels and internal messages
+        variant["fingerprint"] = hashConfig(sorted(id2word.token2id.items()), variant["corpus"], variant["evaluation"],
+            shared["trainLabels"], shared["internal"].tolist())
+        shared["variants"][name] = variant
+    return shared
+
+# data shared with the worker processes, set once per worker by the pool initializer
+_shared = None
+
+def _initWorker(shared):
+    global _shared
+    _shared = shared
+
+def trainAndEvaluate(config, shared=None):
+    shared = shared if shared is not None else _shared
+    variant = shared["variants"][config["variant"]]
+    # "backend" (see stages/TM/backends.py) is only part of the configuration when it is swept, so results of
+    # earlier sweeps with LdaModel are still found in the results file
+    params = {key: value for key, value in config.items() if key not in ("variant", "backend")}
+    lda_model = createBackend(config.get("backend", "lda"), **params).fit(variant["corpus"], variant["id2word"])
+    topics = inferTopicLabels(lda_model, variant["evaluation"])
+    detectedLabels = np.where(shared["internal"], INTERNAL_LABEL, topics).tolist()
+    overall, quotas = classificationQuota(shared["trainLabels"], detectedLabels)
+    return {"config": config, "fingerprint": variant["fingerprint"], "overall": overall, "quotas": quotas}
+
+def configKey(config, fingerprint=None):
+    return json.dumps([config, fingerprint], sort_keys=True)
+
+def expandGrid(grid, variants):
+    # grid maps LdaModel parameters (and "variant", "backend") to lists of values, missing ones use DEFAULT_LDA_CONFIG
+    grid = dict(grid)
+    grid.setdefault("variant", list(variants))
+    keys = list(grid)
+    configs = []
+    for values in itertools.product(*[grid[key] for key in keys]):
+        config = dict(DEFAULT_LDA_CONFIG)
+        config.update(zip(keys, values))
+        configs.append(config)
+    return configs
+
+class LdaSweep:
+    # Parallel hyperparameter sweep of LdaModel. The corpora are built once and passed to every worker
+    # process, each worker trains one configuration at a time. Results are appended to a JSON lines file
+    # with the fingerprint of the variant's data; configurations already in the file for the same data are
+    # skipped, so an interrupted sweep resumes where it stopped. Results for other data (e.g. before the
+    # mailbox or the preprocessing changed) stay in the file but are not reused or returned.
+    def __init__(self, casesList, variants, resultsFile, n_workers=4):
+        self.shared = prepareSweepCorpus(casesList, variants)
+        self.resultsFile = resultsFile
+        self.n_workers = n_workers
+
+    def loadResults(self):
+        results = []
+        if path.exists(self.resultsFile):
+            with open(self.resultsFile, "r") as f:
+                results = [json.loads(line) for line in f if line.strip()]
+        return results
+
+    @profiled("lda_sweep", counts=lambda results, *args, **kwargs: {"configs": len(results)})
+    def run(self, grid, verbose=True):
+        variants = self.shared["variants"]
+        results = [r for r in self.loadResults()
+            if r["config"]["variant"] in variants and r.get("fingerprint") == variants[r["config"]["variant"]]["fingerprint"]]
+        done = set(configKey(r["config"], r["fingerprint"]) for r in results)
+        configs = [c for c in expandGrid(grid, variants) if configKey(c, variants[c["variant"]]["fingerprint"]) not in done]
+        if path.dirname(self.resultsFile):
+            makedirs(path.dirname(self.resultsFile), exist_ok=True)
+        with open(self.resultsFile, "a") as f:
+            if self.n_workers <= 1:
+                finished = (trainAndEvaluate(c, self.shared) for c in configs)
+                self._store(f, finished, results, verbose)
+            else:
+                with ProcessPoolExecutor(max_workers=self.n_workers, initializer=_initWorker, initargs=(self.shared,)) as pool:
+                    futures = [pool.submit(trainAndEvaluate, c) for c in configs]
+                    self._store(f, (future.result() for future in as_completed(futures)), results, verbose)
+        return self.toDataFrame(results)
+
+    @staticmethod
+    def _store(f, finished, results, verbose):
+        for result in finished:
+            f.write(json.dumps(result)+"\n")
+            f.flush()
+            results.append(result)
+            if verbose:
+                print(f"{result['config']}: {result['overall']}")
+
+    @staticmethod
+    def toDataFrame(results):
+        rows = []
+        for r in results:
+            row = dict(r["config"])
+            row["overall"] = r["overall"]
+            row["quotas"] = r["quotas"]
+            rows.append(row)
+        return pd.DataFrame(rows)
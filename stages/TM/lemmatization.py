@@ -0,0 +1,73 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import spacy
+from stages.TM.cache import cachedApply, getModelVersion
+from stages.utils.profiling import profiled, countTokens
+
+# POS tags and lemmas only need tok2vec, tagger, attribute_ruler and lemmatizer
+LEMMATIZE_EXCLUDE = ("parser", "ner", "senter")
+
+# loaded models per process, keyed by model name and excluded components
+_nlpModels = dict()
+
+def loadNlpModel(model="en_core_web_sm", exclude=LEMMATIZE_EXCLUDE):
+    key = (model, tuple(exclude))
+    if key not in _nlpModels:
+        _nlpModels[key] = spacy.load(model, exclude=list(exclude))
+    return _nlpModels[key]
+
+def lemmatizeDocs(nlp, corpora, pos_tags, batch_size):
+    out = []
+    for doc in nlp.pipe(corpora, batch_size=batch_size):
+        out.append([t.lemma_ for t in doc if (t.pos_ in pos_tags and not t.is_stop)])
+    return out
+
+def _initWorker(model, exclude):
+    # load the model once per worker process
+    loadNlpModel(model, exclude)
+
+def _lemmatizeChunk(corpora, pos_tags, batch_size, model, exclude):
+    return lemmatizeDocs(loadNlpModel(model, exclude), corpora, pos_tags, batch_size)
+
+class Lemmatizer:
+    # Batched lemmatization with nlp.pipe. The model is loaded once per process and reused across calls;
+    # with n_process > 1, a pool of worker processes with a loaded model each is kept until close() is called.
+    def __init__(self, model="en_core_web_sm", exclude=LEMMATIZE_EXCLUDE, n_process=1):
+        self.model = model
+        self.exclude = tuple(exclude)
+        self.n_process = n_process
+        self.pool = None
+
+    def apply(self, corpora, pos_tags=["NOUN", "ADJ", "VERB", "ADV", "PROPN", "DOBJ"], batch_size=256):
+        corpora = list(corpora)
+        if self.n_process <= 1:
+            return lemmatizeDocs(loadNlpModel(self.model, self.exclude), corpora, pos_tags, batch_size)
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.n_process, initializer=_initWorker,
+                initargs=(self.model, self.exclude))
+        # a few chunks per worker to balance uneven message lengths
+        chunkSize = max(batch_size, -(-len(corpora) // (self.n_process*4)))
+        chunks = [corpora[i:i+chunkSize] for i in range(0, len(corpora), chunkSize)]
+        lemmatizeChunk = partial(_lemmatizeChunk, pos_tags=pos_tags, batch_size=batch_size, model=self.model, exclude=self.exclude)
+        out = []
+        for lemmas in self.pool.map(lemmatizeChunk, chunks):
+            out.extend(lemmas)
+        return out
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+# lemmatizers per configuration, so that worker pools are reused across calls of lemmatizeBatched
+_lemmatizers = dict()
+
+@profiled("lemmatize", counts=countTokens)
+def lemmatizeBatched(corpora, pos_tags=["NOUN", "ADJ", "VERB", "ADV", "PROPN", "DOBJ"], batch_size=256, n_process=1,
+        model="en_core_web_sm", exclude=LEMMATIZE_EXCLUDE, cache=None):
+    # with a TokenCache, only messages that are not in the cache yet are lemmatized
+    key = (model, tuple(exclude), n_process)
+    if key not in _lemmatizers:
+        _lemmatizers[key] = Lemmatizer(model, exclude, n_process)
+    config = ["lemmatize", getModelVersion(model), sorted(pos_tags), sorted(exclude)]
+    return cachedApply(cache, config, list(corpora), lambda texts: _lemmatizers[key].apply(texts, pos_tags, batch_size))
@@ -0,0 +1,262 @@
+from array import array
+from collections.abc import Mapping
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from stages.utils.utils import toEpochSeconds, fromEpochSeconds, toEpochSecondsArray
+
+NO_TIMESTAMP = np.iinfo(np.int64).min # timestamp not parsed yet, parsed from Datetime on first access
+NO_LABEL = np.iinfo(np.int64).min # no detected label yet ("" on the Message API)
+
+SUBJECT_PREFIXES = ("Re:", "RE:", "Fwd:", "FWD:", "Aw:", "AW:")
+
+def cleanSubject(subject):
+    for prefix in SUBJECT_PREFIXES:
+        subject = subject.replace(prefix, "")
+    return subject
+
+class Int64Column:
+    # growable int64 array, view() returns the filled part without copying
+    __slots__ = ("data", "size")
+
+    def __init__(self, capacity=1024):
+        self.data = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+
+    def _reserve(self, size):
+        if size > len(self.data):
+            data = np.empty(max(size, 2*len(self.data)), dtype=np.int64)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+
+    def append(self, value):
+        self._reserve(self.size+1)
+        self.data[self.size] = value
+        self.size += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        self._reserve(self.size+len(values))
+        self.data[self.size:self.size+len(values)] = values
+        self.size += len(values)
+
+    def view(self):
+        return self.data[:self.size]
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        return self.data[:self.size][index]
+
+    def __setitem__(self, index, value):
+        self.data[:self.size][index] = value
+
+class MessageStore:
+    # Columnar storage of messages, addressed by row index. Actors are interned to integer ids, timestamps
+    # (epoch seconds) and detected labels are int64 columns, texts and header fields are kept in lists.
+    # StoredMessage and StoredCase provide the Message and Case API on top of the store.
+    def __init__(self):
+        self.actorIds = dict()
+        self.actors = []
+        self.froms = Int64Column()
+        self.tos = Int64Column()
+        self.timestamps = Int64Column()
+        self.detectedLabels = Int64Column()
+        self.subjects = []
+        self.contents = []
+        self.datetimes = []
+        self.messageIds = []
+        self.inReplyTos = []
+        self.trainLabels = []
+
+    def __len__(self):
+        return len(self.subjects)
+
+    def internActor(self, actor):
+        actorId = self.actorIds.get(actor)
+        if actorId is None:
+            actorId = len(self.actors)
+            self.actorIds[actor] = actorId
+            self.actors.append(actor)
+        return actorId
+
+    def append(self, from_, to, subject, content, datetime_, messageId, inReplyTo, trainLabel, timestamp=None):
+        self.froms.append(self.internActor(from_))
+        self.tos.append(self.internActor(to))
+        self.timestamps.append(NO_TIMESTAMP if timestamp is None else timestamp)
+        self.detectedLabels.append(NO_LABEL)
+        self.subjects.append(cleanSubject(subject))
+        self.contents.append(content)
+        self.datetimes.append(datetime_)
+        self.messageIds.append(messageId)
+        self.inReplyTos.append(inReplyTo)
+        self.trainLabels.append(trainLabel)
+        return len(self)-1
+
+    def extend(self, file):
+        # appends all rows of a (cleaned) dataset and returns their row indices
+        start = len(self)
+        codes, uniques = pd.factorize(pd.concat([file["From"], file["To"]], ignore_index=True))
+        actorIds = np.array([self.internActor(actor) for actor in uniques], dtype=np.int64)
+        self.froms.extend(actorIds[codes[:file.shape[0]]])
+        self.tos.extend(actorIds[codes[file.shape[0]:]])
+        if "Timestamp" in file.columns:
+            # dates already parsed by the DataCleaner
+            self.timestamps.extend(toEpochSecondsArray(file["Timestamp"]))
+        else:
+            self.timestamps.extend(np.full(file.shape[0], NO_TIMESTAMP))
+        self.detectedLabels.extend(np.full(file.shape[0], NO_LABEL))
+        subjects = file["Subject"]
+        for prefix in SUBJECT_PREFIXES:
+            subjects = subjects.str.replace(prefix, "", regex=False)
+        self.subjects.extend(subjects.tolist())
+        self.contents.extend(file["Content"].tolist())
+        self.datetimes.extend(file["Datetime"].tolist())
+        self.messageIds.extend(file["Message-ID"].tolist())
+        self.inReplyTos.extend(file["In-Reply-To"].tolist())
+        self.trainLabels.extend(file["Label"].tolist())
+        return range(start, len(self))
+
+    def getTimestamps(self, indices, timest_format="%Y-%m-%d %H:%M:%S"):
+        timestamps = self.timestamps[indices]
+        missing = np.flatnonzero(timestamps == NO_TIMESTAMP)
+        for i in missing:
+            index = indices[i]
+            self.timestamps[index] = toEpochSeconds(datetime.strptime(self.datetimes[index], timest_format))
+            timestamps[i] = self.timestamps[index]
+        return timestamps
+
+    def getMessages(self, indices):
+        return [StoredMessage(self, index) for index in indices]
+
+class StoredMeta(Mapping):
+    # read-only meta dict of a stored message
+    __slots__ = ("store", "index")
+    columns = {"Datetime": "datetimes", "Message-ID": "messageIds", "In-Reply-To": "inReplyTos"}
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, key):
+        return getattr(self.store, self.columns[key])[self.index]
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+class StoredMessage:
+    # Message API for one row of a MessageStore
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    @property
+    def from_(self):
+        return self.store.actors[self.store.froms[self.index]]
+
+    @property
+    def to(self):
+        return self.store.actors[self.store.tos[self.index]]
+
+    @property
+    def subject(self):
+        return self.store.subjects[self.index]
+
+    @property
+    def content(self):
+        return self.store.contents[self.index]
+
+    @property
+    def meta(self):
+        return StoredMeta(self.store, self.index)
+
+    @property
+    def trainLabel(self):
+        return self.store.trainLabels[self.index]
+
+    @property
+    def detectedLabel(self):
+        label = self.store.detectedLabels[self.index]
+        return "" if label == NO_LABEL else int(label)
+
+    @detectedLabel.setter
+    def detectedLabel(self, label):
+        self.store.detectedLabels[self.index] = label
+
+    @property
+    def timestamp(self):
+        timestamp = self.store.timestamps[self.index]
+        return None if timestamp == NO_TIMESTAMP else int(timestamp)
+
+    def getTimestamp(self, timest_format="%Y-%m-%d %H:%M:%S"):
+        return int(self.store.getTimestamps([self.index], timest_format)[0])
+
+    def __eq__(self, other):
+        return isinstance(other, StoredMessage) and self.store is other.store and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.store), self.index))
+
+class StoredCase:
+    # Case API over row indices of a MessageStore, actors are kept as interned ids
+    __slots__ = ("store", "clusterId", "indices", "actorIds", "actorIdSet", "timeRange", "version")
+
+    def __init__(self, rootMessage):
+        # each case cluster is defined by the ID of its first message (root message)
+        self.store = rootMessage.store
+        self.clusterId = self.store.messageIds[rootMessage.index]
+        self.indices = array("q", [rootMessage.index])
+        self.actorIds = [int(self.store.froms[rootMessage.index]), int(self.store.tos[rootMessage.index])]
+        self.actorIdSet = set(self.actorIds)
+        self.timeRange = None
+        self.version = 0
+
+    @property
+    def rootMessage(self):
+        return StoredMessage(self.store, self.indices[0])
+
+    @property
+    def messages(self):
+        return self.store.getMessages(self.indices)
+
+    @property
+    def actors(self):
+        return [self.store.actors[actorId] for actorId in self.actorIds]
+
+    def add(self, message):
+        self.indices.append(message.index)
+        self.version += 1
+        if self.timeRange is not None:
+            timestamp = int(self.store.getTimestamps([message.index], self.timeRange[2])[0])
+            self.timeRange[0] = min(self.timeRange[0], timestamp)
+            self.timeRange[1] = max(self.timeRange[1], timestamp)
+        if len(self.actorIds) != len(self.actorIdSet):
+            # root message was sent to its own address, actors become unique with the first added message
+            self.actorIds = list(self.actorIdSet)
+        for actorId in (int(self.store.froms[message.index]), int(self.store.tos[message.index])):
+            if actorId not in self.actorIdSet:
+                self.actorIdSet.add(actorId)
+                self.actorIds.append(actorId)
+
+    def getTimeRange(self, timest_format="%Y-%m-%d %H:%M:%S"):
+        if self.timeRange is None:
+            timestamps = self.store.getTimestamps(np.frombuffer(self.indices, dtype=np.int64), timest_format)
+            self.timeRange = [int(timestamps.min()), int(timestamps.max()), timest_format]
+        return self.timeRange[0], self.timeRange[1]
+
+    def getCaseDuration(self, timest_format="%Y-%m-%d %H:%M:%S"):
+        start, end = self.getTimeRange(timest_format)
+        return fromEpochSeconds(start), fromEpochSeconds(end), float(end-start)
+
+    def getMessageCount(self):
+        return len(self.indices)
+    def getHeadCount(self):
+        return len(self.actorIds)
+    def checkCaseSuccess(self):
+        return not (self.store.detectedLabels[np.frombuffer(self.indices, dtype=np.int64)] == 2).any()
@@ -0,0 +1,137 @@
+import json, shutil
+from datetime import datetime
+from os import path, makedirs, listdir, replace, getpid
+import numpy as np
+import gensim
+import gensim.corpora
+from gensim.matutils import dirichlet_expectation
+from stages.TM.textmining import Message
+from stages.utils.profiling import profiled
+
+VERSION_PREFIX = "v"
+
+def getCategoryMap(topicLabels, num_topics):
+    # Message.mapDetectedCategory as a table: detected label -> activity name for all topics of a model
+    return {label: Message.mapDetectedCategory(label, topicLabels) for label in range(num_topics)}
+
+def growLdaModel(lda_model, id2word):
+    # Extends a trained model to the terms that were added to its dictionary. The new terms start with the
+    # prior only (no topic statistics), so the topics of the known terms are unchanged until the next update.
+    added = len(id2word)-lda_model.num_terms
+    if added <= 0:
+        return lda_model
+    eta = np.asarray(lda_model.eta, dtype=lda_model.dtype)
+    if eta.ndim == 1:
+        eta = np.concatenate([eta, np.full(added, eta.mean(), dtype=lda_model.dtype)])
+    elif eta.ndim == 2:
+        eta = np.hstack([eta, np.repeat(eta.mean(axis=1, keepdims=True), added, axis=1)])
+    lda_model.eta = eta
+    lda_model.state.eta = eta
+    lda_model.state.sstats = np.hstack([lda_model.state.sstats, np.zeros((lda_model.num_topics, added), dtype=lda_model.dtype)])
+    lda_model.num_terms = len(id2word)
+    lda_model.id2word = id2word
+    lda_model.expElogbeta = np.exp(dirichlet_expectation(lda_model.state.get_lambda()))
+    return lda_model
+
+class StoredModel:
+    # dictionary, LDA model and label mapping of one version of a ModelStore
+    def __init__(self, version, lda_model, id2word, topicLabels, categoryMap, meta):
+        self.version = version
+        self.lda_model = lda_model
+        self.id2word = id2word
+        self.topicLabels = topicLabels
+        self.categoryMap = categoryMap
+        self.meta = meta
+
+    def mapDetectedCategory(self, label):
+        return self.categoryMap.get(int(label), "?")
+
+    def classifyMessages(self, casesList, chunksize=2000, onlyNew=True):
+        # by default only the messages without detected label, e.g. the messages added to the cases since the
+        # last classification; returns their detected labels
+        return casesList.classifyMessages(self.lda_model, self.id2word, chunksize, onlyNew)
+
+class ModelStore:
+    # Versioned store of topic models in a directory. Every version is a subdirectory with the gensim
+    # dictionary, the LDA model and meta.json (topicLabels, the table of detected label -> activity of
+    # Message.mapDetectedCategory, the parent version and the number of training documents). Versions are
+    # never overwritten: update() trains the latest (or a given) version online on new documents and saves
+    # the result as a new version.
+    def __init__(self, directory):
+        self.directory = directory
+        makedirs(directory, exist_ok=True)
+
+    def getVersions(self):
+        return sorted(int(name[len(VERSION_PREFIX):]) for name in listdir(self.directory)
+            if name.startswith(VERSION_PREFIX) and name[len(VERSION_PREFIX):].isdigit())
+
+    def getLatestVersion(self):
+        versions = self.getVersions()
+        return versions[-1] if versions else None
+
+    def getPath(self, version):
+        return path.join(self.directory, f"{VERSION_PREFIX}{version:04d}")
+
+    def save(self, lda_model, id2word, topicLabels, categoryMap=None, parent=None, documents=None, meta=None):
+        # stores a new version and returns its number; categoryMap defaults to Message.mapDetectedCategory,
+        # documents (the number of training documents) to the documents the dictionary was built from
+        version = (self.getLatestVersion() or 0)+1
+        categoryMap = categoryMap if categoryMap is not None else getCategoryMap(topicLabels, lda_model.num_topics)
+        info = dict(meta or {})
+        info.update({
+            "version": version,
+            "parent": parent,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "gensim": gensim.__version__,
+            "num_topics": lda_model.num_topics,
+            "num_terms": len(id2word),
+            "documents": documents if documents is not None else id2word.num_docs,
+            "topicLabels": topicLabels,
+            "categoryMap": {str(label): activity for label, activity in categoryMap.items()}
+        })
+        # written to a temporary directory first, a version is either complete or missing
+        tmpPath = f"{self.getPath(version)}.{getpid()}.tmp"
+        makedirs(tmpPath)
+        try:
+            id2word.save(path.join(tmpPath, "dictionary.gensim"))
+            lda_model.save(path.join(tmpPath, "lda.gensim"))
+            with open(path.join(tmpPath, "meta.json"), "w") as f:
+                json.dump(info, f, indent=1)
+            replace(tmpPath, self.getPath(version))
+        except BaseException:
+            shutil.rmtree(tmpPath, ignore_errors=True)
+            raise
+        return version
+
+    def loadMeta(self, version=None):
+        version = self.getLatestVersion() if version is None else version
+        with open(path.join(self.getPath(version), "meta.json")) as f:
+            return json.load(f)
+
+    @profiled("load_model")
+    def load(self, version=None, mmap="r"):
+        # the large arrays of the model are memory-mapped read-only by default, which is enough to classify;
+        # use mmap=None to get a model that can be updated
+        version = self.getLatestVersion() if version is None else version
+        if version is None:
+            raise ValueError(f"No model in {self.directory}")
+        meta = self.loadMeta(version)
+        id2word = gensim.corpora.Dictionary.load(path.join(self.getPath(version), "dictionary.gensim"))
+        lda_model = gensim.models.ldamodel.LdaModel.load(path.join(self.getPath(version), "lda.gensim"), mmap=mmap)
+        categoryMap = {int(label): activity for label, activity in meta["categoryMap"].items()}
+        return StoredModel(version, lda_model, id2word, meta["topicLabels"], categoryMap, meta)
+
+    @profiled("update_model", counts=lambda version, self, texts, *args, **kwargs: {"messages": len(texts)})
+    def update(self, texts, version=None, growDictionary=True, passes=1, chunksize=None):
+        # Online update of a stored model with the token lists of new messages (LdaModel.update). With
+        # growDictionary, new terms are added to the dictionary and the model; otherwise they are ignored.
+        # The topics keep their numbers, so the label mapping of the parent version is kept.
+        stored = self.load(version, mmap=None)
+        if growDictionary:
+            stored.id2word.add_documents(texts)
+            growLdaModel(stored.lda_model, stored.id2word)
+        corpus = [stored.id2word.doc2bow(text) for text in texts]
+        stored.lda_model.update(corpus, passes=passes, chunksize=chunksize or stored.lda_model.chunksize)
+        documents = stored.meta["documents"]+len(texts)
+        return self.save(stored.lda_model, stored.id2word, stored.topicLabels, stored.categoryMap, parent=stored.version,
+            documents=documents)
@@ -1,23 +1,38 @@
 from os import path
 from datetime import datetime
-import spacy, gensim
+import gensim
 import pandas as pd
-from stages.utils.utils import convertDateString
+from stages.utils.utils import convertDateString, toEpochSeconds, fromEpochSeconds, toEpochSecondsArray
+from stages.TM.grouping import ActorTimeIndex, MessageIdIndex, ThreadIndex, SECONDS_PER_DAY
+from stages.TM.lemmatization import lemmatizeBatched
+from stages.TM.cache import cachedApply, resolveCache
+from stages.TM.topics import detectLabels
+from stages.TM.messagestore import MessageStore, StoredMessage, StoredCase, cleanSubject
+from stages.TM.eventlog import getEventLogFrame, getDebugLogFrame, toTypedFrame, writeEventLog, writeEventLogAsync
 from tqdm import tqdm
-from spacy.matcher import Matcher
-import statistics
+import numpy as np
+from stages.TM.casestats import CaseStatistics
+import pickle
+from stages.utils.profiling import profiled, countTokens
 
 class Message:
-    def __init__(self, from_, to, subject, content, meta, trainLabel):
+    def __init__(self, from_, to, subject, content, meta, trainLabel, timestamp=None):
         self.from_ = from_
         self.to = to
-        self.subject = subject.replace("Re:", "").replace("RE:", "").replace("Fwd:", "").replace("FWD:", "").replace("Aw:", "").replace("AW:", "")
+        self.subject = cleanSubject(subject)
         self.content = content
         self.meta = meta
         self.trainLabel = trainLabel
         self.detectedLabel = ""
+        # seconds since epoch, either passed from the parsed Timestamp column or parsed once on first access
+        self.timestamp = timestamp
         if "Datetime" not in self.meta.keys():
             raise ValueError("This message does not have datetime information which is necessary!")
+
+    def getTimestamp(self, timest_format="%Y-%m-%d %H:%M:%S"):
+        if self.timestamp is None:
+            self.timestamp = toEpochSeconds(datetime.strptime(self.meta["Datetime"], timest_format))
+        return self.timestamp
     
     @staticmethod
     def mapDetectedCategory(id, topicLabels):
@@ -36,6 +51,22 @@ class Message:
         elif id == 8: # not mapped
             return "?"
 
+def iterMessages(file):
+    # yields one message per row of the (cleaned) dataset
+    columns = ["From", "To", "Subject", "Content", "Datetime", "Message-ID", "In-Reply-To", "Label"]
+    if "Timestamp" in file.columns:
+        # dates already parsed by the DataCleaner
+        timestamps = toEpochSecondsArray(file["Timestamp"]).tolist()
+    else:
+        timestamps = [None]*file.shape[0]
+    for from_, to, subject, content, datetime_, messageId, inReplyTo, train_label, timestamp in zip(*[file[column] for column in columns], timestamps):
+        meta = {
+            "Datetime": datetime_,
+            "Message-ID": messageId,
+            "In-Reply-To": inReplyTo
+        }
+        yield Message(from_, to, subject, content, meta, train_label, timestamp)
+
 class Case:
     def __init__(self, rootMessage):
         # each case cluster is defined by the ID of its first message (root message)
@@ -43,24 +74,35 @@ class Case:
         self.rootMessage = rootMessage
         self.messages = [rootMessage]
         self.actors = [rootMessage.from_, rootMessage.to]
+        self.actorSet = set(self.actors)
+        self.timeRange = None # [start, end, timest_format], computed on first use and kept up to date by add
+        self.version = 0 # incremented by add, invalidates statistics cached by CasesList
     def add(self, message):
         self.messages.append(message)
-        self.actors.extend([message.from_, message.to])
-        self.actors = list(set(self.actors))
+        self.version += 1
+        if self.timeRange is not None:
+            timestamp = message.getTimestamp(self.timeRange[2])
+            self.timeRange[0] = min(self.timeRange[0], timestamp)
+            self.timeRange[1] = max(self.timeRange[1], timestamp)
+        if len(self.actors) != len(self.actorSet):
+            # root message was sent to its own address, actors become unique with the first added message
+            self.actors = list(self.actorSet)
+        # only append new actors instead of rebuilding the list on every append
+        for actor in (message.from_, message.to):
+            if actor not in self.actorSet:
+                self.actorSet.add(actor)
+                self.actors.append(actor)
     
-    def getCaseDuration(self, timest_format):
-        lowest = datetime(1970,1,1)
-        highest = datetime(1970,1,1)
-        for idx, message in enumerate(self.messages):
-            if idx == 0:
-                lowest = datetime.strptime(message.meta["Datetime"], timest_format)
-                highest = datetime.strptime(message.meta["Datetime"], timest_format)
-                continue
-            if (datetime.strptime(message.meta["Datetime"], timest_format) > highest):
-                highest = datetime.strptime(message.meta["Datetime"], timest_format)
-            if (datetime.strptime(message.meta["Datetime"], timest_format) < lowest):
-                lowest = datetime.strptime(message.meta["Datetime"], timest_format)
-        return lowest, highest, (highest-lowest).total_seconds()
+    def getTimeRange(self, timest_format="%Y-%m-%d %H:%M:%S"):
+        # first and last timestamp of the case in epoch seconds
+        if self.timeRange is None:
+            timestamps = [message.getTimestamp(timest_format) for message in self.messages]
+            self.timeRange = [min(timestamps), max(timestamps), timest_format]
+        return self.timeRange[0], self.timeRange[1]
+
+    def getCaseDuration(self, timest_format="%Y-%m-%d %H:%M:%S"):
+        start, end = self.getTimeRange(timest_format)
+        return fromEpochSeconds(start), fromEpochSeconds(end), float(end-start)
     
     def getMessageCount(self):
         return len(self.messages)
@@ -95,6 +137,28 @@ class CasesList(list):
                 print(f"To: {m.to}")
                 print(f"Message:\n{m.content}")
     
+    def getMessages(self):
+        return [message for case in self for message in case.messages]
+
+    @profiled("label", counts=lambda labels, *args, **kwargs: {"messages": len(labels)})
+    def classifyMessages(self, lda_model, id2word, chunksize=2000, onlyNew=False):
+        # assigns detectedLabel to all messages (with onlyNew to the messages without detected label): topic
+        # distributions are inferred in batches and the internal-domain rule is applied to all messages at once
+        messages = [m for m in self.getMessages() if not onlyNew or m.detectedLabel == ""]
+        if not messages:
+            return np.empty(0, dtype=np.int64)
+        labels = detectLabels(
+            lda_model,
+            id2word,
+            [f"{m.subject} {m.content}" for m in messages],
+            [m.from_ for m in messages],
+            [m.to for m in messages],
+            chunksize
+        )
+        for message, label in zip(messages, labels.tolist()):
+            message.detectedLabel = label
+        return labels
+
     def getCorpora(self):
         corpora = []
         for case in self:
@@ -118,56 +182,57 @@ class CasesList(list):
                     out.append(message)
         return out
     
-    def generateEventLog(self, name, filePath, topicLabels):
-        log = []
-        for case in self:
-            for m in case.messages:
-                line = dict()
-                line["Case"] = case.clusterId
-                line["Date"] = m.meta["Datetime"]
-                line["Action"] = Message.mapDetectedCategory(m.detectedLabel, topicLabels)
-                log.append(line)
-                pdlog = pd.DataFrame(log)
-                fileName = f"eventlog_{name}.csv"
-                pdlog.to_csv(path.join(filePath, fileName), index=False, sep=";")
+    @profiled("eventlog", counts=lambda eventLog, *args, **kwargs: {"events": len(eventLog)})
+    def getEventLog(self, topicLabels):
+        return getEventLogFrame(self, topicLabels)
+
+    def toEventLog(self, topicLabels, name=None, filePath=None, format="csv"):
+        # In-memory event log for the process mining stage (Date as timestamps, see dataFrameToLog).
+        # With name and filePath, the artifact is written in the background; returns the event log and
+        # the Future of the writing (None without artifact).
+        eventLog = self.getEventLog(topicLabels)
+        writing = None
+        if name is not None and filePath is not None:
+            writing = writeEventLogAsync(eventLog, path.join(filePath, f"eventlog_{name}.{format}"), format)
+        return toTypedFrame(eventLog), writing
+
+    def generateEventLog(self, name, filePath, topicLabels, format="csv", chunksize=None):
+        # the log is built once and written in a single pass (or in chunks of rows), format "csv" or "parquet"
+        fileName = f"eventlog_{name}.{format}"
+        writeEventLog(self.getEventLog(topicLabels), path.join(filePath, fileName), format, chunksize)
         return fileName
 
     def generateDebugLog(self, name, filePath):
-        log = []
-        for case in self:
-            for m in case.messages:
-                line = dict()
-                line["Date"] = m.meta["Datetime"]
-                line["Subject"] = m.subject
-                line["Content"] = m.content
-                line["DetectedLabel"] = m.detectedLabel
-                line["TrainLabel"] = m.trainLabel
-                log.append(line)
-                pdlog = pd.DataFrame(log)
-                fileName = f"debuglog_{name}.csv"
-                pdlog.to_csv(path.join(filePath, fileName), index=False, sep=";")
+        fileName = f"debuglog_{name}.csv"
+        getDebugLogFrame(self).to_csv(path.join(filePath, fileName), index=False, sep=";")
         return fileName
     
-    def getMedianCaseDuration(self, timest_format):
-        alldurations = []
-        for case in self:
-            alldurations.append(case.getCaseDuration(timest_format)[2])
-        return statistics.median(alldurations)
+    def getStatistics(self, timest_format="%Y-%m-%d %H:%M:%S"):
+        # CaseStatistics of all cases, cached until cases are added, removed or replaced or a case gets new messages
+        cached = getattr(self, "_statistics", None)
+        if (cached is None or cached[0] != timest_format or len(cached[1]) != len(self)
+                or any(a is not b or a.version != version for a, b, version in zip(self, cached[1], cached[2]))):
+            cached = (timest_format, list(self), [case.version for case in self], CaseStatistics(self, timest_format))
+            self._statistics = cached
+        return cached[3]
+
+    def getMedianCaseDuration(self, timest_format, subset=None):
+        return self.getStatistics(timest_format).median("duration", subset)
     
-    def getMedianCaseMessageCount(self):
-        msgCounts = []
-        for case in self:
-            msgCounts.append(len(case.messages))
-        return statistics.median(msgCounts)
+    def getMedianCaseMessageCount(self, subset=None):
+        return self.getStatistics().median("messageCount", subset)
     
-    def getMedianCaseHeadcount(self):
-        headCount = []
-        for case in self:
-            headCount.append(len(case.actors))
-        return statistics.median(headCount)
+    def getMedianCaseHeadcount(self, subset=None):
+        return self.getStatistics().median("headCount", subset)
+
+    def getSuccessMask(self):
+        return np.array([case.checkCaseSuccess() for case in self], dtype=bool)
             
     @staticmethod
-    def groupCases(file, maxDays):
+    @profiled("group", counts=lambda cases, file, *args, **kwargs: {"messages": file.shape[0], "cases": len(cases)})
+    def groupCases(file, maxDays, indexed=False, compact=False):
+        if indexed or compact:
+            return CasesList.groupCasesIndexed(file, maxDays, compact)
         cases = CasesList()
         # create new column to indicate whether message has been added to case or not
         file["assignedToCase"] = False
@@ -219,21 +284,212 @@ class CasesList(list):
                     file.loc[index, "assignedToCase"] = True
         return cases
 
-def lemmatize(corpora, pos_tags=["NOUN", "ADJ", "VERB", "ADV", "PROPN", "DOBJ"]):
-    nlp = spacy.load("en_core_web_sm", disable=["parser", "ner"])
-    out = []
-    for corpus in corpora:
-        doc = nlp(corpus)
-        corpus_l = []
-        corpus_l.extend([t.lemma_ for t in doc if (t.pos_ in pos_tags and not t.is_stop)])
-        out.append(corpus_l)
-    return out
-    
-def gen_words(corpora):
-    out = []
-    for corpus in corpora:
-        corpustext = " ".join(corpus)
-        new = gensim.utils.simple_preprocess(corpustext, deacc=True)
-        new = [x.replace("want", "") for x in new]
-        out.append(new)
-    return out
\ No newline at end of file
+    @staticmethod
+    def groupCasesIndexed(file, maxDays, compact=False):
+        # Produces the same case assignment as groupCases, but looks up candidate cases in a Message-ID index
+        # and a per-actor time index instead of scanning all messages of all existing cases.
+        # With compact, messages are kept in a MessageStore and the cases are StoredCases over it.
+        grouper = CaseGrouper(maxDays, closeCases=False, store=MessageStore() if compact else None)
+        grouper.addChunk(file)
+        return grouper.flush()
+
+    @staticmethod
+    def groupThreads(file, maxDays):
+        # Row order independent grouping: replies are linked to their parents with a Message-ID index and
+        # union-find (ThreadIndex) in one pass, even if the parent comes after the reply in the file.
+        # Messages are then assigned to cases in chronological order: the first message of a thread determines
+        # the case like in groupCases (actor/time matching if it has no In-Reply-To, new case otherwise) and
+        # all further messages of the thread are added to this case.
+        messages = []
+        timestamps = []
+        threads = ThreadIndex()
+        for m in tqdm(iterMessages(file), total=file.shape[0]):
+            messages.append(m)
+            timestamps.append(m.getTimestamp())
+            inReplyTo = m.meta["In-Reply-To"]
+            threads.add(m.meta["Message-ID"], None if pd.isnull(inReplyTo) else inReplyTo)
+
+        cases = CasesList()
+        threadCases = dict() # thread root -> case index
+        actorIndex = ActorTimeIndex(maxDays)
+        # stable sort, messages with identical timestamps keep their row order
+        for idx in sorted(range(len(messages)), key=timestamps.__getitem__):
+            m = messages[idx]
+            thread = threads.find(idx)
+            caseIdx = threadCases.get(thread)
+            if caseIdx is None and pd.isnull(m.meta["In-Reply-To"]):
+                caseIdx = actorIndex.findCase((m.from_, m.to), timestamps[idx])
+            if caseIdx is None:
+                cases.append(Case(m))
+                caseIdx = len(cases)-1
+            else:
+                cases[caseIdx].add(m)
+            threadCases.setdefault(thread, caseIdx)
+            actorIndex.add((m.from_, m.to), timestamps[idx], caseIdx)
+        file["assignedToCase"] = True
+        return cases
+
+class CaseGrouper:
+    # Incremental case grouping with the rules of CasesList.groupCases, for messages that are passed in
+    # chunks, e.g. from pd.read_csv(chunksize=...), a generator or daily mailbox deltas.
+    # With closeCases, only open cases are kept in memory: after each chunk, a case is closed as soon as the
+    # newest message seen is more than maxDays after the case's last message, since no message without
+    # In-Reply-To that comes in order can be assigned to it anymore. Messages may come out of order (e.g. late
+    # mail in a delta): the actors and time ranges of closed cases are kept in closedIndex (one entry per actor
+    # and day, not the messages), and only a message without In-Reply-To that matches a closed case is rejected
+    # with a ValueError; such messages have to be passed earlier or grouped with closeCases=False. Replies to
+    # messages of closed cases start a new case, like replies to unknown messages. With a MessageStore, chunks
+    # are appended to the store and the cases are StoredCases.
+    def __init__(self, maxDays, closeCases=True, store=None):
+        self.maxDays = maxDays
+        self.closeCases = closeCases
+        self.store = store
+        self.openCases = dict() # case number (creation order) -> case
+        self.lastTimestamps = dict() # case number -> timestamp of the newest message in the case
+        self.clusters = dict() # clusterId -> numbers of open cases with this clusterId (ids may be duplicated)
+        self.messageIds = MessageIdIndex()
+        self.actorIndex = ActorTimeIndex(maxDays)
+        self.caseCount = 0
+        self.watermark = None
+        self.closedIndex = ActorTimeIndex(maxDays) # actors and times of the messages of closed cases
+
+    def _register(self, caseNo, m, timestamp):
+        self.messageIds.add(m.meta["Message-ID"], caseNo)
+        self.actorIndex.add((m.from_, m.to), timestamp, caseNo)
+        if timestamp > self.lastTimestamps.get(caseNo, timestamp-1):
+            self.lastTimestamps[caseNo] = timestamp
+
+    def _createCase(self, m, timestamp):
+        caseNo = self.caseCount
+        self.caseCount += 1
+        case = Case(m) if self.store is None else StoredCase(m)
+        self.openCases[caseNo] = case
+        self.clusters.setdefault(case.clusterId, []).append(caseNo)
+        self._register(caseNo, m, timestamp)
+
+    def _addMessageToCluster(self, clusterId, m, timestamp):
+        for caseNo in self.clusters.get(clusterId, []):
+            self.openCases[caseNo].add(m)
+            self._register(caseNo, m, timestamp)
+
+    def addMessage(self, m):
+        timestamp = m.getTimestamp()
+        if not pd.isnull(m.meta["In-Reply-To"]):
+            caseNo = self.messageIds.findCase(m.meta["In-Reply-To"])
+            clusterId = self.openCases[caseNo].clusterId if caseNo is not None else None
+            if clusterId:
+                self._addMessageToCluster(clusterId, m, timestamp)
+            else:
+                self._createCase(m, timestamp)
+        else:
+            if self.closedIndex.findCase((m.from_, m.to), timestamp) is not None:
+                raise ValueError(f"Message {m.meta['Message-ID']} ({m.meta['Datetime']}) belongs to a case that was "
+                    "already closed")
+            caseNo = self.actorIndex.findCase((m.from_, m.to), timestamp)
+            if caseNo is not None:
+                self._addMessageToCluster(self.openCases[caseNo].clusterId, m, timestamp)
+            else:
+                self._createCase(m, timestamp)
+        if self.watermark is None or timestamp > self.watermark:
+            self.watermark = timestamp
+
+    @profiled("add_chunk", counts=lambda closed, self, chunk: {"messages": chunk.shape[0], "cases": len(closed)})
+    def addChunk(self, chunk):
+        # groups all messages of the chunk and returns the cases that were closed by it
+        if self.store is None:
+            messages = iterMessages(chunk)
+        else:
+            messages = (StoredMessage(self.store, index) for index in self.store.extend(chunk))
+        for m in tqdm(messages, total=chunk.shape[0]):
+            self.addMessage(m)
+        chunk["assignedToCase"] = True
+        return self.closeInactiveCases()
+
+    def closeInactiveCases(self):
+        closed = CasesList()
+        if not self.closeCases or self.watermark is None:
+            return closed
+        # messages of cases ending before cutoff cannot be matched by any later message
+        cutoff = self.watermark - self.maxDays*SECONDS_PER_DAY
+        for caseNo in sorted(n for n, last in self.lastTimestamps.items() if last < cutoff):
+            case = self._removeCase(caseNo)
+            for m in case.messages:
+                self.closedIndex.add((m.from_, m.to), m.getTimestamp(), 0)
+            closed.append(case)
+        return closed
+
+    def _removeCase(self, caseNo):
+        case = self.openCases.pop(caseNo)
+        del self.lastTimestamps[caseNo]
+        self.clusters[case.clusterId].remove(caseNo)
+        if not self.clusters[case.clusterId]:
+            del self.clusters[case.clusterId]
+        for m in case.messages:
+            # other open cases with a message of the same id stay in the index
+            self.messageIds.remove(m.meta["Message-ID"], caseNo)
+            self.actorIndex.remove((m.from_, m.to), m.getTimestamp(), caseNo)
+        return case
+
+    def getOpenCases(self):
+        return CasesList(self.openCases.values())
+
+    def flush(self):
+        # closes and returns all remaining open cases in creation order
+        closed = CasesList(self._removeCase(caseNo) for caseNo in sorted(self.openCases))
+        self.actorIndex = ActorTimeIndex(self.maxDays)
+        return closed
+
+    def save(self, filePath):
+        with open(filePath, "wb") as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(filePath):
+        with open(filePath, "rb") as f:
+            return pickle.load(f)
+
+    @staticmethod
+    def fromCasesList(cases, maxDays):
+        # restores the grouping state from an already grouped CasesList, so that new messages can be appended
+        # without regrouping the history. Cases outside of the maxDays horizon are dropped from memory.
+        store = cases[0].store if len(cases) and isinstance(cases[0], StoredCase) else None
+        grouper = CaseGrouper(maxDays, store=store)
+        for case in cases:
+            caseNo = grouper.caseCount
+            grouper.caseCount += 1
+            grouper.openCases[caseNo] = case
+            grouper.clusters.setdefault(case.clusterId, []).append(caseNo)
+            for m in case.messages:
+                timestamp = m.getTimestamp()
+                grouper._register(caseNo, m, timestamp)
+                if grouper.watermark is None or timestamp > grouper.watermark:
+                    grouper.watermark = timestamp
+        grouper.closeInactiveCases()
+        return grouper
+
+    @staticmethod
+    def groupChunks(chunks, maxDays, compact=False):
+        # generator over closed cases for an iterable of dataframe chunks
+        grouper = CaseGrouper(maxDays, store=MessageStore() if compact else None)
+        for chunk in chunks:
+            yield from grouper.addChunk(chunk)
+        yield from grouper.flush()
+
+def lemmatize(corpora, pos_tags=["NOUN", "ADJ", "VERB", "ADV", "PROPN", "DOBJ"], cache=None):
+    # lemmatizeBatched with the defaults of the notebook: the model is loaded once per process and kept warm,
+    # messages are looked up in the default TokenCache (see resolveCache)
+    return lemmatizeBatched(corpora, pos_tags, cache=resolveCache(cache))
+
+@profiled("gen_words", counts=countTokens)
+def gen_words(corpora, cache=None):
+    def preprocess(texts):
+        out = []
+        for corpustext in texts:
+            new = gensim.utils.simple_preprocess(corpustext, deacc=True)
+            new = [x.replace("want", "") for x in new]
+            out.append(new)
+        return out
+    # only corpora that are not in the cache yet are preprocessed; the default TokenCache is used unless a
+    # cache or False is passed (see resolveCache)
+    config = ["gen_words", f"gensim=={gensim.__version__}", "simple_preprocess(deacc=True)", "replace(want)"]
+    return cachedApply(resolveCache(cache), config, [" ".join(corpus) for corpus in corpora], preprocess)
\ No newline at end of file
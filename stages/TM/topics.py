@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+INTERNAL_LABEL = 3 # detected label for messages within the organization
+
+def getDomain(address):
+    return address.split("@")[1]
+
+def isInternal(from_, to):
+    return getDomain(from_) == getDomain(to)
+
+def classificationQuota(trainLabels, detectedLabels, verbose=False):
+    # Share of messages per train label that got the same detected label (the highest detected label that
+    # occurs more than twice), weighted by the number of messages per label.
+    # Returns the overall quota and [quota, message count] per train label in order of first appearance.
+    labels = []
+    byLabel = dict()
+    for trainLabel, detectedLabel in zip(trainLabels, detectedLabels):
+        if trainLabel not in byLabel:
+            labels.append(trainLabel)
+            byLabel[trainLabel] = []
+        byLabel[trainLabel].append(detectedLabel)
+    quotas = []
+    for label in labels:
+        detected = byLabel[label]
+        frequent = [i for i in set(detected) if detected.count(i) > 2]
+        max_occur = max(frequent) if frequent else 0
+        num = detected.count(max_occur)
+        quota = num/len(detected)
+        if verbose:
+            print(f"Correctly identified messages for label {label}: {num}/{len(detected)}={quota}")
+        quotas.append([quota, len(detected)])
+    overall = sum(q*n for q, n in quotas)/sum(n for _, n in quotas)
+    return overall, quotas
+
+def internalMask(froms, tos):
+    # vectorized isInternal for two columns of addresses
+    return (pd.Series(froms, dtype=object).str.split("@").str[1].values == pd.Series(tos, dtype=object).str.split("@").str[1].values)
+
+def inferTopicLabels(model, bows, chunksize=2000):
+    # Most probable topic per document, with the topic distributions inferred in batches. This is the topic of
+    # max(model[bow], key=lambda x:x[1])[0] for almost all documents, but not guaranteed to be: model.inference
+    # starts from a random gamma drawn from model.random_state, which is consumed in a different order per
+    # batch than per document, so documents with nearly tied topics can get a different label.
+    labels = np.empty(len(bows), dtype=np.int64)
+    for start in range(0, len(bows), chunksize):
+        gamma, _ = model.inference(bows[start:start+chunksize])
+        labels[start:start+chunksize] = np.argmax(gamma, axis=1)
+    return labels
+
+def detectLabels(model, id2word, texts, froms, tos, chunksize=2000):
+    # detected label per message: INTERNAL_LABEL within the organization, most probable topic otherwise
+    bows = [id2word.doc2bow(text.split()) for text in texts]
+    topics = inferTopicLabels(model, bows, chunksize)
+    return np.where(internalMask(froms, tos), INTERNAL_LABEL, topics)
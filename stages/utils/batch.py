@@ -0,0 +1,115 @@
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from copy import deepcopy
+from datetime import datetime
+from os import path, makedirs, getpid
+import pandas as pd
+from stages.utils.discover import loadConfig, discover
+from stages.utils.profiling import getPeakRss
+from stages.TM.lemmatization import loadNlpModel
+
+# memory estimate of a dataset before the first results: peak RSS of a worker without data and the
+# additional memory per byte of the input file
+DEFAULT_WORKER_BASELINE_MB = 600
+DEFAULT_MB_PER_INPUT_MB = 100
+
+# peak RSS of the worker process after loading the models, set by the pool initializer
+_baselineRss = None
+
+def _initWorker(config):
+    # models are loaded once per worker and reused for all of its datasets
+    global _baselineRss
+    if config["lemmatize"]["model"] is not None:
+        try:
+            loadNlpModel(config["lemmatize"]["model"])
+        except OSError as e:
+            # the runs that need the model report the error
+            print(f"Could not load {config['lemmatize']['model']}: {e}")
+    _baselineRss = getPeakRss()
+
+def getDatasetName(inputFile):
+    return path.splitext(path.basename(inputFile))[0]
+
+def runDataset(config, inputFile):
+    # one discover run in a worker; returns the summary row of the dataset and its learning curve fits
+    config = deepcopy(config)
+    config["input"]["file"] = inputFile
+    name = getDatasetName(inputFile)
+    row = {"dataset": name, "file": inputFile, "worker": getpid()}
+    fits = None
+    before = getPeakRss()
+    try:
+        directory, artifacts = discover(config, name=name)
+        table, fits = artifacts["lpa"]
+        row.update({"directory": directory, "quota": artifacts["quota"]["quota"]})
+        row.update(artifacts["metrics"])
+        row["error"] = None
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    after = getPeakRss()
+    row["worker_baseline_mb"] = _baselineRss
+    row["peak_rss_mb"] = after
+    # the peak RSS of a worker only grows, the growth during this run is a lower bound of its memory use
+    row["growth_mb"] = after-before if after is not None and before is not None else None
+    return row, fits
+
+class MemoryEstimator:
+    # Memory of a dataset run in MB estimated from the size of the input file. Starts with the defaults and
+    # is updated with the baseline and the growth per input MB reported by finished runs.
+    def __init__(self, baselineMb=DEFAULT_WORKER_BASELINE_MB, mbPerInputMb=DEFAULT_MB_PER_INPUT_MB):
+        self.baselineMb = baselineMb
+        self.mbPerInputMb = mbPerInputMb
+        self.observed = False
+
+    def estimate(self, inputFile):
+        return self.baselineMb+self.mbPerInputMb*path.getsize(inputFile)/2**20
+
+    def update(self, row):
+        if row["worker_baseline_mb"] is None or row["growth_mb"] is None:
+            return
+        ratio = row["growth_mb"]/max(path.getsize(row["file"])/2**20, 1e-3)
+        # the first observation replaces the defaults, later ones can only raise the estimate
+        self.baselineMb = row["worker_baseline_mb"] if not self.observed else max(self.baselineMb, row["worker_baseline_mb"])
+        self.mbPerInputMb = ratio if not self.observed else max(self.mbPerInputMb, ratio)
+        self.observed = True
+
+def runBatch(inputFiles, configFile=None, n_workers=2, memoryLimitMb=None, config=None):
+    # Runs the discover pipeline for several datasets in a pool of worker processes and returns one summary
+    # table: classification quota, fitness, precision, generalization and simplicity per dataset and the
+    # learning curve fits of its practitioners (one row per dataset, actor and degree). With memoryLimitMb,
+    # a dataset is only started while the estimated memory of all running datasets stays within the limit;
+    # larger datasets are started first. Every worker keeps its loaded models for all of its datasets.
+    config = deepcopy(config) if config is not None else loadConfig(configFile)
+    # the datasets run in parallel, conformance and lemmatization of a single dataset do not
+    config["metrics"]["n_workers"] = 1
+    config["lemmatize"]["n_process"] = 1
+    pending = sorted(inputFiles, key=path.getsize, reverse=True)
+    estimator = MemoryEstimator()
+    rows = []
+    fits = []
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_initWorker, initargs=(config,)) as pool:
+        running = dict()
+        while pending or running:
+            while pending and len(running) < n_workers:
+                estimate = estimator.estimate(pending[0])
+                if running and memoryLimitMb is not None and sum(running.values())+estimate > memoryLimitMb:
+                    break
+                running[pool.submit(runDataset, config, pending.pop(0))] = estimate
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+                row, fit = future.result()
+                estimator.update(row)
+                rows.append(row)
+                if fit is not None:
+                    fits.append(fit.assign(dataset=row["dataset"]))
+                print(f"Finished {row['dataset']}" + (f" with {row['error']}" if row["error"] else ""))
+    summary = pd.DataFrame(rows)
+    if fits:
+        summary = summary.merge(pd.concat(fits, ignore_index=True), on="dataset", how="left")
+    order = [getDatasetName(f) for f in inputFiles]
+    summary = summary.sort_values("dataset", key=lambda names: names.map(order.index), kind="stable", ignore_index=True)
+    makedirs(config["output"]["directory"], exist_ok=True)
+    summaryFile = path.join(config["output"]["directory"], f"batch_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv")
+    summary.to_csv(summaryFile, index=False)
+    print(f"Summary written to {summaryFile}")
+    return summary
@@ -0,0 +1,187 @@
+import json
+from copy import deepcopy
+from datetime import datetime
+from os import path, makedirs
+import numpy as np
+import pandas as pd
+from stages.utils.utils import DataCleaner
+from stages.utils.pipeline import Stage, ArtifactCache, Pipeline, hashFile
+from stages.utils.profiling import Profiler
+from stages.TM.textmining import CasesList, gen_words
+from stages.TM.lemmatization import lemmatizeBatched
+from stages.TM.cache import TokenCache
+from stages.TM.ldasweep import DEFAULT_LDA_CONFIG
+from stages.TM.backends import trainTopicModel
+from stages.TM.topics import classificationQuota
+from stages.TM.eventlog import toTypedFrame, writeEventLog
+from stages.PM.processmining import dataFrameToLog, heuristicsMiner, computeMetrics
+from stages.PM.conformance import computeVariantMetrics
+from stages.PM.discoverysweep import HEURISTICS_CONFIG
+from stages.LPA.evaluation import getEvaluationTable
+from stages.LPA.fitting import fitLearningCurves
+
+# settings of main.ipynb; a configuration file only has to contain the values that differ
+DEFAULT_CONFIG = {
+    "input": {"file": path.join("resources", "dataset", "Mail_ApplicationDataset_-2.csv"), "delimiter": ";"},
+    "clean": {"removeURLs": True, "removeMultWhitespace": True, "lowercasing": False, "dateFormat": "%Y-%m-%d %H:%M:%S", "vectorized": True},
+    "group": {"maxDays": 8, "indexed": True},
+    # model None: no lemmatization, the messages are tokenized with gen_words only
+    "lemmatize": {"model": "en_core_web_sm", "pos_tags": ["NOUN", "ADJ", "VERB", "ADV", "PROPN", "DOBJ"], "batch_size": 256,
+        "n_process": 1, "gen_words": False},
+    "lda": dict(DEFAULT_LDA_CONFIG),
+    # backend of stages/TM/backends.py: "lda", "multicore" (workers None: cores - 1), "nmf" or "sklearn_lda"
+    "topicModel": {"backend": "lda", "workers": None},
+    "label": {"chunksize": 2000},
+    # first element empty as gensim LDA model starts indexing with 1
+    "topicLabels": [None, "Initial Application by Candidate", "Automatic Reply", "Internal Communication / Clarification of Requirements",
+        "Organizational Communication with Candidate for Clarification of Skills or Interview Invitation",
+        "Job Offer / Contract Negotiation", "Application Declined"],
+    "mine": dict(HEURISTICS_CONFIG),
+    "metrics": {"variants": True, "n_workers": 2},
+    "lpa": {"actors": ["j.parker@ziegler-cat.com", "j.nielsen@ziegler-cat.com"], "normalize": "global", "degrees": [2, 3]},
+    "cache": {"artifacts": path.join("out", "cache", "artifacts"), "tokens": path.join("out", "cache", "tokens.sqlite")},
+    "output": {"directory": path.join("out", "runs"), "eventLogFormat": "csv", "render": False}
+}
+
+def loadConfig(filePath=None):
+    # DEFAULT_CONFIG updated section by section with the values of a JSON configuration file
+    config = deepcopy(DEFAULT_CONFIG)
+    if filePath is not None:
+        with open(filePath) as f:
+            for section, values in json.load(f).items():
+                if isinstance(values, dict) and isinstance(config.get(section), dict):
+                    config[section].update(values)
+                else:
+                    config[section] = values
+    return config
+
+def readInput(config):
+    return pd.read_csv(config["input"]["file"], delimiter=config["input"]["delimiter"])
+
+def cleanMessages(config, inputFile):
+    cleaned = inputFile.copy()
+    DataCleaner(**config["clean"]).apply(cleaned)
+    return cleaned
+
+def groupMessages(config, cleaned):
+    return CasesList.groupCases(cleaned.copy(), **config["group"])
+
+def lemmatizeMessages(config, casesList):
+    settings = dict(config["lemmatize"])
+    cache = TokenCache(config["cache"]["tokens"]) if config["cache"].get("tokens") else False
+    try:
+        corpora = casesList.getCorpora()
+        if settings["model"] is None:
+            return gen_words([corpus.split() for corpus in corpora], cache=cache)
+        tokens = lemmatizeBatched(corpora, settings["pos_tags"], settings["batch_size"], settings["n_process"], settings["model"], cache=cache)
+        return gen_words(tokens, cache=cache) if settings["gen_words"] else tokens
+    finally:
+        if cache is not False:
+            cache.close()
+
+def trainLda(config, tokens):
+    return trainTopicModel(tokens, **config["topicModel"], **config["lda"])
+
+def labelMessages(config, casesList, model):
+    # detected labels of all messages in the order of CasesList.getMessages
+    lda_model, id2word = model
+    return casesList.classifyMessages(lda_model, id2word, **config["label"])
+
+def applyLabels(casesList, labels):
+    for message, label in zip(casesList.getMessages(), np.asarray(labels).tolist()):
+        message.detectedLabel = label
+    return casesList
+
+def buildEventLog(config, casesList, labels):
+    return applyLabels(casesList, labels).getEventLog(config["topicLabels"])
+
+def computeQuota(config, casesList, labels):
+    # classification quota of the detected labels against the labels of the dataset
+    messages = casesList.getMessages()
+    overall, quotas = classificationQuota([m.trainLabel for m in messages], np.asarray(labels).tolist())
+    return {"quota": overall, "quotas": quotas}
+
+def convertEventLog(config, eventLog):
+    return dataFrameToLog(toTypedFrame(eventLog))
+
+def mineModel(config, log):
+    return heuristicsMiner(log, config["mine"])
+
+def evaluateModel(config, log, model):
+    net, im, fm = model
+    if config["metrics"]["variants"]:
+        fitness, prec, gen, simp = computeVariantMetrics(log, net, im, fm, config["metrics"]["n_workers"])
+    else:
+        fitness, prec, gen, simp = computeMetrics(log, net, im, fm)
+    return {"fitness": fitness["log_fitness"], "precision": prec, "generalization": gen, "simplicity": simp}
+
+def analyzeLearning(config, casesList, labels):
+    settings = config["lpa"]
+    table = getEvaluationTable(applyLabels(casesList, labels), actors=settings["actors"], normalize=settings["normalize"])
+    return table, fitLearningCurves(table, degrees=settings["degrees"])
+
+# clean -> group -> lemmatize -> lda -> label -> eventlog -> log -> mine -> metrics, group + label -> quota, lpa
+DISCOVER_STAGES = [
+    Stage("input", readInput, sections=["input"], fingerprint=lambda config: hashFile(config["input"]["file"]), cache=False),
+    Stage("clean", cleanMessages, ["input"], ["clean"]),
+    Stage("group", groupMessages, ["clean"], ["group"]),
+    Stage("lemmatize", lemmatizeMessages, ["group"], ["lemmatize"]),
+    Stage("lda", trainLda, ["lemmatize"], ["lda", "topicModel"], version=2),
+    Stage("label", labelMessages, ["group", "lda"], ["label"]),
+    Stage("quota", computeQuota, ["group", "label"]),
+    Stage("eventlog", buildEventLog, ["group", "label"], ["topicLabels"]),
+    Stage("log", convertEventLog, ["eventlog"]),
+    Stage("mine", mineModel, ["log"], ["mine"]),
+    Stage("metrics", evaluateModel, ["log", "mine"], ["metrics"]),
+    Stage("lpa", analyzeLearning, ["group", "label"], ["lpa"])
+]
+
+DISCOVER_TARGETS = ("quota", "metrics", "lpa")
+
+def writeOutputs(config, pipeline, directory):
+    # artifacts are taken from the pipeline, so only stages that are not cached are evaluated
+    artifacts = {name: pipeline.get(name) for name in ("eventlog", "quota", "metrics", "lpa")}
+    output = config["output"]
+    files = [writeEventLog(artifacts["eventlog"], path.join(directory, f"eventlog.{output['eventLogFormat']}"), output["eventLogFormat"])]
+    with open(path.join(directory, "metrics.json"), "w") as f:
+        json.dump(dict(artifacts["metrics"], quota=artifacts["quota"]["quota"]), f, indent=1)
+    files.append("metrics.json")
+    table, fits = artifacts["lpa"]
+    table.to_csv(path.join(directory, "lpa_scores.csv"), index=False)
+    fits.to_csv(path.join(directory, "lpa_fits.csv"), index=False)
+    files += ["lpa_scores.csv", "lpa_fits.csv"]
+    with open(path.join(directory, "config.json"), "w") as f:
+        json.dump(config, f, indent=1)
+    files.append("config.json")
+    if output["render"]:
+        from stages.PM.rendering import Renderer
+        renderer = Renderer(directory, headless=True)
+        renderer.renderPetriNet(*pipeline.get("mine"), name="heu1", log=pipeline.get("log"))
+        files += [path.basename(f) for rendered in renderer.wait().values() for f in rendered]
+        renderer.close()
+    return files
+
+def discover(config, force=(), targets=DISCOVER_TARGETS, name=None):
+    # Runs the discover pipeline headless and writes event log, metrics, learning metric scores and fits, the
+    # configuration and the stage profile to a new directory below output.directory (named by the time and
+    # name). Stage artifacts are cached in cache.artifacts; stages in force (and the stages depending on them)
+    # are recomputed. Returns the directory and the artifacts of the targets.
+    runName = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")+(f"_{name}" if name else "")
+    directory = path.join(config["output"]["directory"], runName)
+    makedirs(directory, exist_ok=True)
+    cache = ArtifactCache(config["cache"]["artifacts"]) if config["cache"].get("artifacts") else None
+    with Profiler(meta={"input": config["input"]["file"]}) as profiler:
+        pipeline = Pipeline(DISCOVER_STAGES, config, cache)
+        artifacts = pipeline.run(targets, force)
+        files = writeOutputs(config, pipeline, directory)
+    for stage, status in pipeline.status.items():
+        print(f"{stage}: {status}")
+    files.append(path.basename(profiler.save(path.join(directory, "profile.json"))))
+    print(f"Results written to {directory}: {', '.join(files)}")
+    return directory, artifacts
+
+def runDiscover(configFile=None, inputFile=None, force=(), targets=DISCOVER_TARGETS):
+    config = loadConfig(configFile)
+    if inputFile is not None:
+        config["input"]["file"] = inputFile
+    return discover(config, force, targets)
@@ -0,0 +1,122 @@
+import hashlib, json, pickle
+from os import path, makedirs, replace, getpid
+from stages.utils.profiling import profileStage
+
+def hashFile(filePath, blockSize=1024*1024):
+    digest = hashlib.sha256()
+    with open(filePath, "rb") as f:
+        for block in iter(lambda: f.read(blockSize), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hashConfig(*parts):
+    # stable hash of JSON-like configuration values, independent of the order of dict keys
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class Stage:
+    # One step of a Pipeline. function(config, *artifacts of inputs) returns the artifact of the stage.
+    # sections are the configuration sections the stage reads, fingerprint(config) adds data that is not part of
+    # the configuration to the cache key (e.g. the hash of an input file). version has to be increased when the
+    # function changes its results, so that cached artifacts of older versions are not used anymore.
+    def __init__(self, name, function, inputs=[], sections=[], fingerprint=None, version=1, cache=True):
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.sections = list(sections)
+        self.fingerprint = fingerprint
+        self.version = version
+        self.cache = cache
+
+class ArtifactCache:
+    # pickled stage artifacts in a directory, one file per stage and cache key
+    def __init__(self, directory):
+        self.directory = directory
+        makedirs(directory, exist_ok=True)
+
+    def getPath(self, name, key):
+        return path.join(self.directory, f"{name}-{key[:24]}.pkl")
+
+    def has(self, name, key):
+        return path.exists(self.getPath(name, key))
+
+    def load(self, name, key):
+        with open(self.getPath(name, key), "rb") as f:
+            return pickle.load(f)
+
+    def store(self, name, key, artifact):
+        # written to a temporary file per process first, an interrupted run or a concurrent run of the same
+        # stage (see stages/utils/batch.py) does not leave a broken artifact
+        filePath = self.getPath(name, key)
+        tmpPath = f"{filePath}.{getpid()}.tmp"
+        with open(tmpPath, "wb") as f:
+            pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+        replace(tmpPath, filePath)
+
+class Pipeline:
+    # Stage graph with artifact caching. The cache key of a stage is derived from its name and version, its
+    # configuration sections, its fingerprint and the keys of its inputs, so a stage is only recomputed if
+    # anything it depends on changed. Stages are evaluated lazily from the requested targets: a cached artifact
+    # is loaded without evaluating the stages before it.
+    def __init__(self, stages, config, cache=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.config = config
+        self.cache = cache
+        self.keys = self.getKeys()
+        self.artifacts = dict()
+        self.status = dict() # stage -> "computed" or "cached"
+
+    def getKeys(self):
+        keys = dict()
+        def visit(name, visiting):
+            if name in keys:
+                return keys[name]
+            if name in visiting:
+                raise ValueError(f"Stage {name} depends on itself")
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage {name}")
+            stage = self.stages[name]
+            inputKeys = [visit(input, visiting | {name}) for input in stage.inputs]
+            keys[name] = hashConfig(name, stage.version, [self.config.get(section) for section in stage.sections],
+                stage.fingerprint(self.config) if stage.fingerprint is not None else None, inputKeys)
+            return keys[name]
+        for name in self.stages:
+            visit(name, set())
+        return keys
+
+    def get(self, name, force=()):
+        # artifact of a stage, from memory, from the cache or computed; stages in force are always recomputed
+        if name in self.artifacts:
+            return self.artifacts[name]
+        stage = self.stages[name]
+        key = self.keys[name]
+        if stage.cache and self.cache is not None and name not in force and self.cache.has(name, key):
+            with profileStage(f"load_{name}"):
+                artifact = self.cache.load(name, key)
+            self.status[name] = "cached"
+        else:
+            inputs = [self.get(input, force) for input in stage.inputs]
+            artifact = stage.function(self.config, *inputs)
+            self.status[name] = "computed"
+            if stage.cache and self.cache is not None:
+                with profileStage(f"store_{name}"):
+                    self.cache.store(name, key, artifact)
+        self.artifacts[name] = artifact
+        return artifact
+
+    def getDependents(self, names):
+        # the given stages and all stages that depend on them
+        dependents = set(names)
+        changed = True
+        while changed:
+            changed = False
+            for stage in self.stages.values():
+                if stage.name not in dependents and dependents.intersection(stage.inputs):
+                    dependents.add(stage.name)
+                    changed = True
+        return dependents
+
+    def run(self, targets=None, force=()):
+        # artifacts of the targets (all stages by default); forced stages and their dependents are recomputed
+        targets = list(self.stages) if targets is None else targets
+        force = self.getDependents(force)
+        return {name: self.get(name, force) for name in targets}
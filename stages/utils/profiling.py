@@ -0,0 +1,204 @@
+import json, platform, sys, threading, time, tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, the peak RSS is not recorded there
+    resource = None
+
+PROFILE_COLUMNS = ["stage", "depth", "calls", "wall_s", "cpu_s", "peak_rss_mb", "alloc_peak_mb"]
+# relative change of a profile diff that counts as regression
+REGRESSION_THRESHOLD = 0.1
+
+def getPeakRss():
+    # high-water mark of the resident set size of the process in MB (ru_maxrss is in KB on Linux, bytes on macOS)
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/2**20 if sys.platform == "darwin" else peak/2**10
+
+class StageRecord:
+    # measurements of one execution of a stage; counts holds item counts like messages, cases, events or tokens
+    __slots__ = ("name", "depth", "wall", "cpu", "peakRss", "allocPeak", "counts", "_start", "_allocStart")
+
+    def __init__(self, name, depth, counts):
+        self.name = name
+        self.depth = depth
+        self.counts = dict(counts)
+        self.wall = self.cpu = self.peakRss = self.allocPeak = None
+
+    def count(self, **counts):
+        self.counts.update(counts)
+
+    def toDict(self):
+        row = {"stage": self.name, "depth": self.depth, "calls": 1, "wall_s": self.wall, "cpu_s": self.cpu,
+            "peak_rss_mb": self.peakRss, "alloc_peak_mb": self.allocPeak}
+        row.update(self.counts)
+        return row
+
+class _NoRecord:
+    # returned by profileStage when no profiler is active, counting is a no-op
+    def count(self, **counts):
+        pass
+
+_NO_RECORD = _NoRecord()
+
+class Profiler:
+    # Records wall time, CPU time, peak RSS and item counts of the instrumented stages (profileStage, profiled)
+    # while it is active. Nested stages are named by their path, e.g. "conformance/precision", stages in other
+    # threads (e.g. background artifact writing) are top-level stages. Without
+    # traceMemory, a stage costs two clock readings and a getrusage call, so profiling can stay enabled;
+    # traceMemory additionally records the peak of Python allocations per stage with tracemalloc, which slows
+    # down allocation-heavy code considerably.
+    def __init__(self, traceMemory=False, meta=None):
+        self.traceMemory = traceMemory
+        self.meta = dict(meta or {})
+        self.records = []
+        self._local = threading.local()
+
+    @property
+    def open(self):
+        # stack of the stages that are currently executed in the calling thread
+        if not hasattr(self._local, "open"):
+            self._local.open = []
+        return self._local.open
+
+    def start(self):
+        global _active
+        self.meta.setdefault("started", datetime.now().isoformat(timespec="seconds"))
+        self.meta.setdefault("python", platform.python_version())
+        self.meta.setdefault("platform", platform.platform())
+        if self.traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _active = self
+        return self
+
+    def stop(self):
+        global _active
+        if _active is self:
+            _active = None
+        if self.traceMemory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _updateAllocPeaks(self):
+        # tracemalloc has a single peak, it is passed to all open stages before it is reset
+        current, peak = tracemalloc.get_traced_memory()
+        for record in self.open:
+            record.allocPeak = max(record.allocPeak, peak-record._allocStart)
+        tracemalloc.reset_peak()
+        return current
+
+    @contextmanager
+    def stage(self, name, **counts):
+        path = "/".join([record.name for record in self.open[-1:]]+[name])
+        record = StageRecord(path, len(self.open), counts)
+        tracing = self.traceMemory and tracemalloc.is_tracing()
+        if tracing:
+            record._allocStart = self._updateAllocPeaks()
+            record.allocPeak = 0
+        self.open.append(record)
+        record._start = (time.perf_counter(), time.process_time())
+        try:
+            yield record
+        finally:
+            record.wall = time.perf_counter()-record._start[0]
+            record.cpu = time.process_time()-record._start[1]
+            if tracing:
+                self._updateAllocPeaks()
+                record.allocPeak /= 2**20
+            record.peakRss = getPeakRss()
+            self.open.pop()
+            self.records.append(record)
+
+    def toDataFrame(self, aggregate=True):
+        # one row per stage (stages executed several times are summed up, peaks are maximized), ordered by start
+        rows = [record.toDict() for record in sorted(self.records, key=lambda record: record._start)]
+        profile = pd.DataFrame(rows, columns=PROFILE_COLUMNS+sorted({key for row in rows for key in row} - set(PROFILE_COLUMNS)))
+        if aggregate and not profile.empty:
+            # counts that a stage does not record stay empty instead of summing up to 0
+            functions = {column: lambda values: values.sum(min_count=1) for column in profile.columns if column not in ("stage", "depth")}
+            functions.update({"depth": "first", "peak_rss_mb": "max", "alloc_peak_mb": "max"})
+            profile = profile.groupby("stage", sort=False).agg(functions).reset_index()[profile.columns]
+        return profile
+
+    def save(self, filePath):
+        # JSON with the run metadata and the stages, or CSV with the stages only, chosen by the file extension
+        profile = self.toDataFrame()
+        if filePath.endswith(".csv"):
+            profile.to_csv(filePath, index=False)
+        else:
+            with open(filePath, "w") as f:
+                json.dump({"meta": self.meta, "stages": json.loads(profile.to_json(orient="records"))}, f, indent=1)
+        return filePath
+
+# profiler that receives the records of profileStage, set by Profiler.start
+_active = None
+
+def getActiveProfiler():
+    return _active
+
+@contextmanager
+def profileStage(name, **counts):
+    # with profileStage("group", messages=n) as stage: ...; stage.count(cases=len(cases))
+    # does nothing if no profiler is active
+    if _active is None:
+        yield _NO_RECORD
+    else:
+        with _active.stage(name, **counts) as record:
+            yield record
+
+def profiled(name, counts=None):
+    # decorator version of profileStage, counts(result, *args, **kwargs) returns the item counts of a call
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return function(*args, **kwargs)
+            with _active.stage(name) as record:
+                result = function(*args, **kwargs)
+                if counts is not None:
+                    record.count(**counts(result, *args, **kwargs))
+                return result
+        return wrapper
+    return decorator
+
+def countTokens(texts, *args, **kwargs):
+    # counts of a profiled function that returns token lists per message
+    return {"messages": len(texts), "tokens": sum(len(text) for text in texts)}
+
+def loadProfile(filePath):
+    if filePath.endswith(".csv"):
+        return pd.read_csv(filePath)
+    with open(filePath) as f:
+        return pd.DataFrame(json.load(f)["stages"])
+
+def diffProfiles(base, other, threshold=REGRESSION_THRESHOLD):
+    # Compares two profiles (file paths or DataFrames of toDataFrame) stage by stage. Returns the values of
+    # both runs, the relative change and whether wall time, CPU time or allocation peak grew by more than threshold.
+    base = loadProfile(base) if isinstance(base, str) else base
+    other = loadProfile(other) if isinstance(other, str) else other
+    diff = base.merge(other, on="stage", how="outer", suffixes=("_base", "_other"), sort=False)
+    regression = pd.Series(False, index=diff.index)
+    for column in ("wall_s", "cpu_s", "peak_rss_mb", "alloc_peak_mb"):
+        if f"{column}_base" not in diff.columns:
+            continue
+        before = pd.to_numeric(diff[f"{column}_base"], errors="coerce")
+        after = pd.to_numeric(diff[f"{column}_other"], errors="coerce")
+        diff[f"{column}_change"] = (after-before)/before
+        if column != "peak_rss_mb":
+            # the peak RSS of the process only grows over a run, it is reported but not compared
+            regression |= diff[f"{column}_change"] > threshold
+    diff["regression"] = regression
+    columns = ["stage"]+[c for c in diff.columns if c.endswith("_change")]+["regression"]
+    return diff[columns+[c for c in diff.columns if c not in columns]]
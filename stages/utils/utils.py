@@ -2,33 +2,167 @@ from argparse import ArgumentParser
 import datetime
 import dateutil
 import sys, re
+import numpy as np
+import pandas as pd
+from calendar import timegm
 from os import path
+from stages.utils.profiling import profiled, profileStage
 
 def parseArgs():
     parser = ArgumentParser(add_help=False)
     parser.add_argument("-a", "--action", help="Please select an option out of <discover, manage, settings>", type=str, required=True)
     parser.add_argument("-f", "--file", help="Please specify absolute path to initial dataset", type=str)
+    parser.add_argument("-c", "--config", help="JSON configuration file of the pipeline, see stages/utils/discover.py", type=str)
+    parser.add_argument("-r", "--rerun", help="Stages to recompute even if their artifacts are cached", type=str, nargs="*", default=[])
+    parser.add_argument("-b", "--batch", help="Datasets to process in parallel instead of a single file", type=str, nargs="+")
+    parser.add_argument("-w", "--workers", help="Number of worker processes in batch mode", type=int, default=2)
+    parser.add_argument("-m", "--memory", help="Memory limit in MB of all workers in batch mode", type=int)
     args = parser.parse_args()
     
-    # for debugging TODO: remove later
-    args.file = r"C:\Users\flietz\OneDrive - TU Wien\!Studium\1_MSc\!Diplomarbeit\code\pipeline\resources\dataset\Mail_ApplicationDummy.csv"
     if args.action is None or args.action not in ("discover", "manage", "settings"):
         sys.exit('Please specify an action out of <"discover", "manager", "settings">')
 
-    if args.action == "discover" and (args.file is None or not path.exists(args.file)):
+    if args.action == "discover" and args.file is not None and not path.exists(args.file):
         sys.exit("The input file could not be found in the filesystem.")
+    if args.batch is not None and any(not path.exists(f) for f in args.batch):
+        sys.exit("The input files could not be found in the filesystem.")
+    if args.config is not None and not path.exists(args.config):
+        sys.exit("The configuration file could not be found in the filesystem.")
 
-    arguments = {"file": args.file}
+    arguments = {"file": args.file, "config": args.config, "rerun": args.rerun, "batch": args.batch,
+        "workers": args.workers, "memory": args.memory}
     return args.action, arguments
 
+# Formats tried before falling back to dateutil. Only day-first formats are listed: for these, parsing
+# with the format gives the same result as dateutil.parser.parse(..., dayfirst=True). ISO dates are
+# left to dateutil, as it also reads e.g. 2017-05-03 as 5 March with dayfirst=True.
+DAYFIRST_DATE_FORMATS = ["%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M",
+    "%d-%m-%Y %H:%M:%S", "%d-%m-%Y %H:%M", "%d.%m.%Y", "%d/%m/%Y"]
+
+def parseDate(datestring):
+    try:
+        return dateutil.parser.parse(datestring, dayfirst=True)
+    except ValueError as e:
+        raise ValueError("Make sure that all datetime columns are well-formatted "
+        "and that they contain dates that are within the possible bounds.") from e
+
+def normalizeDates(datestrings):
+    # Parses a column of date strings into datetime64 values. Each distinct string is parsed only once,
+    # vectorized with the matching format out of DAYFIRST_DATE_FORMATS and with dateutil for the rest.
+    uniques = pd.Index(pd.unique(datestrings.values))
+    parsed = pd.Series(pd.NaT, index=range(len(uniques)), dtype="datetime64[ns]")
+    remaining = np.ones(len(uniques), dtype=bool)
+    for fmt in DAYFIRST_DATE_FORMATS:
+        if not remaining.any():
+            break
+        attempt = pd.to_datetime(pd.Series(uniques[remaining]), format=fmt, errors="coerce")
+        matched = attempt.notnull().values
+        positions = np.flatnonzero(remaining)[matched]
+        parsed.iloc[positions] = attempt.values[matched]
+        remaining[positions] = False
+    if remaining.any():
+        # timezone information is dropped, formatted dates only contain the local time as well
+        parsed.iloc[np.flatnonzero(remaining)] = [parseDate(d).replace(tzinfo=None) for d in uniques[remaining]]
+    return pd.Series(parsed.values[uniques.get_indexer(datestrings.values)], index=datestrings.index)
+
+def toEpochSeconds(dt):
+    # naive datetime -> integer seconds, differences are identical to datetime arithmetic
+    return timegm(dt.timetuple())
+
+def fromEpochSeconds(seconds):
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=seconds)
+
+def toEpochSecondsArray(timestamps):
+    # datetime64 column -> integer seconds
+    return timestamps.values.astype("datetime64[s]").astype(np.int64)
+
+URL_PATTERN = re.compile(r'https?://\S+')
+MULT_WHITESPACE_PATTERN = re.compile(r' +')
+NEWLINES_PATTERN = re.compile(r'\n+')
+
+def stripEndClauses(content, clauses):
+    clauseIndex = 0
+    index = 0
+    # Find lowest greetings or end clause index and strip off everything that comes after it
+    for item in clauses:
+        # needle and haystack both in lowercase to ignore case
+        index = content.lower().find(item.lower())
+        if index > -1 and (index < clauseIndex or clauseIndex == 0):
+            clauseIndex = index
+    if clauseIndex > 0:
+        return content[:clauseIndex]
+    else:
+        return content
+
+def stripStartClauses(content, clauses):
+    clauseIndex = 0
+    index = 0
+    # Find lowest greetings or end clause index and strip off everything that comes after it
+    for item in clauses:
+        # needle and haystack both in lowercase to ignore case
+        index = content.lower().find(item.lower())
+        if index > -1 and (index > clauseIndex or clauseIndex == 0):
+            clauseIndex = index
+    if clauseIndex > 0:
+        return content[clauseIndex:]
+    else:
+        return content
+
+def compileClausesPattern(clauses):
+    # one alternation over all clauses: a search returns the lowest index at which any of the clauses occurs
+    return re.compile("|".join(re.escape(item.lower()) for item in clauses))
+
+def stripEndClausesSinglePass(content, clauses, pattern):
+    # same result as stripEndClauses with a single search over the lowercased content
+    match = pattern.search(content.lower())
+    if match is None:
+        return content
+    if match.start() > 0:
+        return content[:match.start()]
+    # content starts with a clause, the result then depends on the order of the clauses
+    return stripEndClauses(content, clauses)
+
 class DataCleaner:
-    def __init__(self, removeURLs, removeMultWhitespace, lowercasing, dateFormat):
+    startClausesList = []
+
+    endGreetingsList = ["Yours sincerely", "Sincerely", "Sincerely yours", "Take care", "Regards",
+             "Warm regards", "Best regards", "Kind regards", "Warmest regards", "Yours truly", "Yours,",
+             "Warmly,", "Warm wishes", "Best,", "Best Wishes", "Thanks in advance", "Thank you in advance",
+             "Thanks in advance"]
+
+    confList = ["The information contained in this communication",
+                "The content of this email is confidential", "The content of this e-mail", "This email and attachments (if any) is intended",
+                "This email is intended solely", "This e-mail is intended solely"]
+
+    endClausesList = endGreetingsList+confList
+    endClausesPattern = compileClausesPattern(endClausesList)
+
+    def __init__(self, removeURLs, removeMultWhitespace, lowercasing, dateFormat, vectorized=False):
         self.removeURLs = removeURLs
         self.removeMultWhitespace = removeMultWhitespace
         self.lowercasing = lowercasing
         self.dateFormat = dateFormat
+        # vectorized: clean the columns with pandas string operations instead of row-wise apply, same output
+        self.vectorized = vectorized
+
+    @staticmethod
+    def checkNotEmpty(inputDf):
+        # Not-Empty-Constraints
+        if inputDf["Content"].isnull().values.any() or \
+            inputDf["Datetime"].isnull().values.any() or \
+            inputDf["From"].isnull().values.any() or \
+            inputDf["To"].isnull().values.any():
+            raise AttributeError("Content, Datetime, From and To field cannot be empty. Please check your input dataset.") 
+
+    # Unify Date format - reformat to %Y-%m-%d %H:%M:%S
+    @staticmethod
+    def reformatDate(datestring, dateformat):
+        return parseDate(datestring).strftime(dateformat)
 
+    @profiled("clean", counts=lambda result, self, inputDf: {"messages": inputDf.shape[0]})
     def apply(self, inputDf):
+        if self.vectorized:
+            return self.applyVectorized(inputDf)
         def removeUrl(content):
             return re.sub(r'https?://\S+', '', content)
         def removeMultWhitespace(content):
@@ -41,72 +175,41 @@ class DataCleaner:
             inputDf["Content"] = inputDf.apply(lambda row: removeMultWhitespace(row["Content"]), axis=1)
         if self.lowercasing:
             inputDf["Content"] = inputDf.apply(lambda row: row["Content"].lower(), axis=1)
-        # Not-Empty-Constraints
-        if inputDf["Content"].isnull().values.any() or \
-            inputDf["Datetime"].isnull().values.any() or \
-            inputDf["From"].isnull().values.any() or \
-            inputDf["To"].isnull().values.any():
-            raise AttributeError("Content, Datetime, From and To field cannot be empty. Please check your input dataset.") 
-        # Unify Date format - reformat to %Y-%m-%d %H:%M:%S
-        def reformatDate(datestring, dateformat):
-            try:
-                newDate = dateutil.parser.parse(datestring, dayfirst=True)
-                return newDate.strftime(dateformat)
-            except ValueError as e:
-                raise ValueError("Make sure that all datetime columns are well-formatted "
-                "and that they contain dates that are within the possible bounds.") from e
-        
-        inputDf["Datetime"] = inputDf.apply(lambda row: reformatDate(row["Datetime"], self.dateFormat), axis=1)
+        self.checkNotEmpty(inputDf)
+        inputDf["Datetime"] = inputDf.apply(lambda row: self.reformatDate(row["Datetime"], self.dateFormat), axis=1)
         # clean signatures, clauses
-        def stripEndClauses(content, clauses):
-            clauseIndex = 0
-            index = 0
-            # Find lowest greetings or end clause index and strip off everything that comes after it
-            for item in clauses:
-                # needle and haystack both in lowercase to ignore case
-                index = content.lower().find(item.lower())
-                if index > -1 and (index < clauseIndex or clauseIndex == 0):
-                    clauseIndex = index
-            if clauseIndex > 0:
-                return content[:clauseIndex]
-            else:
-                return content
-        
-        def stripStartClauses(content, clauses):
-            clauseIndex = 0
-            index = 0
-            # Find lowest greetings or end clause index and strip off everything that comes after it
-            for item in clauses:
-                # needle and haystack both in lowercase to ignore case
-                index = content.lower().find(item.lower())
-                if index > -1 and (index > clauseIndex or clauseIndex == 0):
-                    clauseIndex = index
-            if clauseIndex > 0:
-                return content[clauseIndex:]
-            else:
-                return content
-        
-        startClausesList = []
-        
-        endGreetingsList = ["Yours sincerely", "Sincerely", "Sincerely yours", "Take care", "Regards",
-                 "Warm regards", "Best regards", "Kind regards", "Warmest regards", "Yours truly", "Yours,",
-                 "Warmly,", "Warm wishes", "Best,", "Best Wishes", "Thanks in advance", "Thank you in advance",
-                 "Thanks in advance"]
-
-        confList = ["The information contained in this communication",
-                    "The content of this email is confidential", "The content of this e-mail", "This email and attachments (if any) is intended",
-                    "This email is intended solely", "This e-mail is intended solely"]
-
-        endClausesList = endGreetingsList+confList
-
-        inputDf["Content"] = inputDf.apply(lambda row: stripEndClauses(row["Content"], endClausesList), axis=1)    
-        inputDf["Content"] = inputDf.apply(lambda row: stripStartClauses(row["Content"], startClausesList), axis=1)    
+        inputDf["Content"] = inputDf.apply(lambda row: stripEndClauses(row["Content"], self.endClausesList), axis=1)    
+        inputDf["Content"] = inputDf.apply(lambda row: stripStartClauses(row["Content"], self.startClausesList), axis=1)    
 
         # Reduce multiple new-lines to one
         inputDf["Content"] = inputDf.apply(lambda row: re.sub(r'\n+', '\n', row["Content"]), axis=1)
         # Replace new-lines with whitespaces
         inputDf["Content"] = inputDf.apply(lambda row: re.sub(r'\n', ' ', row["Content"]), axis=1)
 
+    def applyVectorized(self, inputDf):
+        # empty fields are checked first, string operations would otherwise pass missing values through
+        self.checkNotEmpty(inputDf)
+        content = inputDf["Content"]
+        if self.removeURLs:
+            content = content.str.replace(URL_PATTERN, '', regex=True)
+        if self.removeMultWhitespace:
+            content = content.str.replace(MULT_WHITESPACE_PATTERN, ' ', regex=True)
+        if self.lowercasing:
+            content = content.str.lower()
+        # dates are parsed once, the parsed values are kept in the Timestamp column for the following stages
+        with profileStage("dates"):
+            timestamps = normalizeDates(inputDf["Datetime"])
+            inputDf["Datetime"] = timestamps.dt.strftime(self.dateFormat)
+            inputDf["Timestamp"] = timestamps
+        # clean signatures, clauses: one search for the earliest of all end clauses per message
+        with profileStage("clauses"):
+            content = pd.Series([stripEndClausesSinglePass(c, self.endClausesList, self.endClausesPattern) for c in content],
+                index=content.index, dtype=object)
+            if self.startClausesList:
+                content = content.map(lambda c: stripStartClauses(c, self.startClausesList))
+        # Reduce multiple new-lines to one and replace it with a whitespace
+        inputDf["Content"] = content.str.replace(NEWLINES_PATTERN, ' ', regex=True)
+
 def convertDateString(datestring):
     try:
         return datetime.datetime.strptime(datestring, "%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,59 @@
+from os import path
+import pandas as pd
+import pytest
+from stages.utils.utils import DataCleaner
+from stages.TM.textmining import CasesList, CaseGrouper
+
+DATASETS = [path.join("resources", "dataset", f"{name}.csv") for name in
+    ("Mail_ApplicationDataset", "Mail_ApplicationDataset_-2", "Mail_ApplicationDataset_-3")]
+
+def clean(df):
+    DataCleaner(removeURLs=True, removeMultWhitespace=True, lowercasing=False, dateFormat="%Y-%m-%d %H:%M:%S").apply(df)
+    return df
+
+def caseAssignment(cases):
+    return sorted(tuple(m.meta["Message-ID"] for m in case.messages) for case in cases)
+
+def message(from_, to, datetime_, messageId, inReplyTo=None):
+    return {"From": from_, "To": to, "Datetime": datetime_, "Message-ID": messageId, "In-Reply-To": inReplyTo,
+        "Subject": "Application", "Content": "Dear sir or madam", "Label": 1}
+
+@pytest.mark.parametrize("filePath", DATASETS)
+def test_chunks_match_groupCases(filePath):
+    # the sample datasets are not in chronological order, so all cases stay open
+    expected = CasesList.groupCases(clean(pd.read_csv(filePath, delimiter=";")), 8)
+    grouper = CaseGrouper(8, closeCases=False)
+    for chunk in pd.read_csv(filePath, delimiter=";", chunksize=10):
+        grouper.addChunk(clean(chunk))
+    assert caseAssignment(grouper.flush()) == caseAssignment(expected)
+
+@pytest.mark.parametrize("filePath", DATASETS)
+def test_closed_chunks_match_groupCases(filePath):
+    df = clean(pd.read_csv(filePath, delimiter=";"))
+    df = df.iloc[pd.to_datetime(df["Datetime"]).argsort(kind="stable")].reset_index(drop=True)
+    expected = CasesList.groupCases(df.copy(), 8)
+    chunks = (df.iloc[start:start+10].copy() for start in range(0, df.shape[0], 10))
+    assert caseAssignment(CaseGrouper.groupChunks(chunks, 8)) == caseAssignment(expected)
+
+def test_late_message_is_grouped_with_open_cases():
+    grouper = CaseGrouper(1)
+    closed = grouper.addChunk(clean(pd.DataFrame([message("x@a.com", "h@b.com", "2020-01-14 06:00:00", "1"),
+        message("y@a.com", "k@b.com", "2020-01-15 12:00:00", "2")])))
+    assert caseAssignment(closed) == [("1",)]
+    # older than the newest message, but no closed case has one of its actors
+    grouper.addChunk(clean(pd.DataFrame([message("y@a.com", "k@b.com", "2020-01-14 08:00:00", "3")])))
+    assert caseAssignment(grouper.flush()) == [("2", "3")]
+
+def test_late_message_of_closed_case_is_rejected():
+    grouper = CaseGrouper(1)
+    grouper.addChunk(clean(pd.DataFrame([message("x@a.com", "h@b.com", "2020-01-14 06:00:00", "1"),
+        message("y@a.com", "k@b.com", "2020-01-15 12:00:00", "2")])))
+    with pytest.raises(ValueError):
+        grouper.addChunk(clean(pd.DataFrame([message("x@a.com", "h@b.com", "2020-01-14 08:00:00", "3")])))
+
+def test_reply_to_duplicated_id_of_closed_case():
+    grouper = CaseGrouper(1)
+    grouper.addChunk(clean(pd.DataFrame([message("x@a.com", "h@b.com", "2020-01-13 06:00:00", "dup"),
+        message("y@a.com", "k@b.com", "2020-01-17 12:00:00", "dup")])))
+    grouper.addChunk(clean(pd.DataFrame([message("k@b.com", "y@a.com", "2020-01-30 12:00:00", "3", inReplyTo="dup")])))
+    assert caseAssignment(grouper.flush()) == [("dup", "3")]